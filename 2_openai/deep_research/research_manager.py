@@ -17,10 +17,53 @@ from specialized_research_agents import (
     clinical_research_agent, genetic_research_agent, epidemiological_research_agent,
     pathophysiological_research_agent, omics_research_agent
 )
+from gemini_config import gemini_model, llama3_3_model
 import asyncio
+import os
+
+# How many research queries may run at once against each configured model; a local model can't take as many as a hosted one
+DEFAULT_CONCURRENCY = int(os.environ.get('RESEARCH_CONCURRENCY', '4'))
+MODEL_CONCURRENCY = {
+    llama3_3_model: 2,
+    gemini_model: 8,
+}
 
 class ResearchManager:
 
+    def __init__(self):
+        self.semaphores: dict[object, asyncio.Semaphore] = {}
+
+    def semaphore_for(self, agent) -> asyncio.Semaphore:
+        """ The semaphore shared by every agent that runs on the same model """
+        model = agent.model
+        if model not in self.semaphores:
+            self.semaphores[model] = asyncio.Semaphore(MODEL_CONCURRENCY.get(model, DEFAULT_CONCURRENCY))
+        return self.semaphores[model]
+
+    async def run_limited(self, agent, query: str):
+        """ Run an agent once its model has a free slot """
+        async with self.semaphore_for(agent):
+            return await Runner.run(agent, query)
+
+    async def run_queries(self, agent, queries: list[str], label: str) -> list[str | None]:
+        """ Run an agent on every query concurrently, within its model's limit.
+        Progress is reported as each finishes; results come back in query order, with None for any that failed. """
+        async def run(index: int, query: str):
+            try:
+                result = await self.run_limited(agent, query)
+                return index, str(result.final_output)
+            except Exception as e:
+                print(f"{label} failed for query: {query}, error: {e}")
+                return index, None
+
+        tasks = [asyncio.create_task(run(index, query)) for index, query in enumerate(queries)]
+        results = [None] * len(tasks)
+        for completed, task in enumerate(asyncio.as_completed(tasks), start=1):
+            index, result = await task
+            results[index] = result
+            print(f"{label}... {completed}/{len(tasks)} completed")
+        return results
+
     async def run_stage1(self, query: str):
         """ Run Stage 1: Initial Disease Scoping & User-Guided Triage"""
         # Guardrail: Validate disease name input
@@ -294,25 +337,9 @@ class ResearchManager:
 
     async def perform_searches(self, search_queries: list[str]) -> list[str]:
         """ Perform the searches to perform for the query """
-        results = []
-        for i, query in enumerate(search_queries):
-            result = await self.search(query)
-            if result is not None:
-                results.append(result)
-            print(f"Searching... {i+1}/{len(search_queries)} completed")
+        results = await self.run_queries(search_agent, search_queries, "Searching")
         print("Finished searching")
-        return results
-
-    async def search(self, query: str) -> str | None:
-        """ Perform a search for the query """
-        try:
-            result = await Runner.run(
-                search_agent,
-                query,
-            )
-            return str(result.final_output)
-        except Exception:
-            return None
+        return [result for result in results if result is not None]
 
     async def generate_questions(self, search_results: list[str]) -> RationaleAndQuestions:
         """ Generate rationales and questions based on search results """
@@ -349,23 +376,17 @@ class ResearchManager:
             'omics': self.conduct_research_area(omics_research_agent, plan.omics_queries)
         }
         
-        results = {}
-        for area, task in research_tasks.items():
-            results[area] = await task
-            print(f"Completed {area} research")
+        # All four areas run at once; the per-model semaphores keep the total number of queries in flight bounded
+        area_results = await asyncio.gather(*research_tasks.values())
+        results = dict(zip(research_tasks, area_results))
+        print(f"Completed {', '.join(research_tasks)} research")
             
         return results
 
     async def conduct_research_area(self, agent, queries: list[str]) -> list[str]:
         """ Conduct research for a specific area """
-        results = []
-        for query in queries:
-            try:
-                result = await Runner.run(agent, query)
-                results.append(str(result.final_output))
-            except Exception as e:
-                print(f"Research failed for query: {query}, error: {e}")
-        return results
+        results = await self.run_queries(agent, queries, f"{agent.name} research")
+        return [result for result in results if result is not None]
 
     async def synthesize_disease_understanding(self, research_results: dict) -> DiseaseUnderstandingReport:
         """ Synthesize foundational research into a disease understanding report """
@@ -429,15 +450,10 @@ class ResearchManager:
 
     async def conduct_pathophysiology_research(self, plan: PathophysiologyResearchPlan) -> list[str]:
         """ Conduct comprehensive pathophysiology research """
-        results = []
-        for query in plan.pathophysiological_queries:
-            try:
-                result = await Runner.run(pathophysiological_research_agent, query)
-                results.append(str(result.final_output))
-                print(f"Completed pathophysiology query: {query[:50]}...")
-            except Exception as e:
-                print(f"Pathophysiology research failed for query: {query}, error: {e}")
-        return results
+        results = await self.run_queries(
+            pathophysiological_research_agent, plan.pathophysiological_queries, "Pathophysiology research"
+        )
+        return [result for result in results if result is not None]
 
     async def synthesize_comprehensive_pathophysiology(self, disease_report: DiseaseUnderstandingReport, 
                                                      pharmacology_report: PharmacologyReport, 
@@ -467,12 +483,14 @@ class ResearchManager:
         input_data = f"Network Model: {network_model.markdown_report}\nPotential Targets: {network_model.potential_targets}"
         
         # Conduct additional searches for each target to fill information gaps
-        target_search_results = []
-        for target in network_model.potential_targets[:5]:  # Limit to top 5 targets to avoid rate limits
-            search_query = f"{target} drug target clinical trials drugs tested mechanism network effects"
-            search_result = await self.search(search_query)
-            if search_result:
-                target_search_results.append(f"Target {target}: {search_result}")
+        targets = network_model.potential_targets[:5]  # Limit to top 5 targets to avoid rate limits
+        search_queries = [f"{target} drug target clinical trials drugs tested mechanism network effects" for target in targets]
+        search_results = await self.run_queries(search_agent, search_queries, "Target research")
+        target_search_results = [
+            f"Target {target}: {search_result}"
+            for target, search_result in zip(targets, search_results)
+            if search_result
+        ]
         
         enhanced_input = f"{input_data}\nAdditional Target Research: {target_search_results}"
         result = await Runner.run(
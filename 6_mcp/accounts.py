@@ -1,14 +1,42 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 import json
 from dotenv import load_dotenv
-from datetime import datetime
-from market import get_share_price
-from database import write_account, read_account, write_log
+import clock
+from market import get_share_price, get_share_prices
+from database import (
+    write_account,
+    read_account,
+    write_log,
+    write_account_fields,
+    write_trade,
+    write_trades,
+    write_portfolio_value,
+    read_data_version,
+    read_account_versions,
+    VersionConflict,
+)
 
 load_dotenv(override=True)
 
 INITIAL_BALANCE = 10_000.0
 SPREAD = 0.002
+MAX_CONFLICT_RETRIES = 20
+# How much history goes into the compact account context sent with each prompt
+RECENT_TRANSACTIONS = 10
+RATIONALE_CHARS = 200
+
+
+def compact_json(data) -> str:
+    """ Serialize for a prompt: no whitespace, and money rounded to cents. """
+    def shrink(value):
+        if isinstance(value, float):
+            return round(value, 2)
+        if isinstance(value, dict):
+            return {key: shrink(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [shrink(item) for item in value]
+        return value
+    return json.dumps(shrink(data), separators=(",", ":"))
 
 
 class Transaction(BaseModel):
@@ -32,6 +60,10 @@ class Account(BaseModel):
     holdings: dict[str, int]
     transactions: list[Transaction]
     portfolio_value_time_series: list[tuple[str, float]]
+    net_invested: float = 0.0
+    realized_pnl: float = 0.0
+    cost_basis: dict[str, float] = {}
+    _version: int = PrivateAttr(default=0)
 
     @classmethod
     def get(cls, name: str):
@@ -45,12 +77,16 @@ class Account(BaseModel):
                 "transactions": [],
                 "portfolio_value_time_series": []
             }
-            write_account(name, fields)
-        return cls(**fields)
+            fields["version"] = write_account(name, fields)
+        version = fields.pop("version", 0)
+        account = cls(**fields)
+        account._version = version
+        return account
     
     
     def save(self):
-        write_account(self.name.lower(), self.model_dump())
+        """ Write the whole account; individual changes are persisted incrementally as they happen. """
+        self._version = write_account(self.name.lower(), self.model_dump())
 
     def reset(self, strategy: str):
         self.balance = INITIAL_BALANCE
@@ -58,27 +94,73 @@ class Account(BaseModel):
         self.holdings = {}
         self.transactions = []
         self.portfolio_value_time_series = []
+        self.net_invested = 0.0
+        self.realized_pnl = 0.0
+        self.cost_basis = {}
         self.save()
 
+    def refresh(self):
+        """ Reload this account from the database, discarding any unsaved changes. """
+        fresh = Account.get(self.name)
+        self._adopt(fresh, fresh._version)
+
+    def _adopt(self, other: "Account", version: int):
+        """ Take on another copy's state, once it's known to match the database at version. """
+        for field in type(self).model_fields:
+            setattr(self, field, getattr(other, field))
+        self._version = version
+
+    def _with_retries(self, change, *args):
+        """
+        Apply a change that ends in a versioned write. If another writer got in first, reload
+        the account and apply it again against the fresh state, so no update is ever lost.
+        """
+        for _ in range(MAX_CONFLICT_RETRIES):
+            try:
+                return change(*args)
+            except VersionConflict:
+                self.refresh()
+        raise ValueError(f"Account {self.name} is busy; please try again.")
+
     def deposit(self, amount: float):
         """ Deposit funds into the account. """
         if amount <= 0:
             raise ValueError("Deposit amount must be positive.")
-        self.balance += amount
+        self._with_retries(self._deposit, amount)
         print(f"Deposited ${amount}. New balance: ${self.balance}")
-        self.save()
 
     def withdraw(self, amount: float):
         """ Withdraw funds from the account, ensuring it doesn't go negative. """
+        self._with_retries(self._withdraw, amount)
+        print(f"Withdrew ${amount}. New balance: ${self.balance}")
+
+    def _deposit(self, amount: float):
+        self._set_balance(self.balance + amount)
+
+    def _withdraw(self, amount: float):
         if amount > self.balance:
             raise ValueError("Insufficient funds for withdrawal.")
-        self.balance -= amount
-        print(f"Withdrew ${amount}. New balance: ${self.balance}")
-        self.save()
+        self._set_balance(self.balance - amount)
+
+    def _set_balance(self, balance: float):
+        draft = self.model_copy(deep=True)
+        draft.balance = balance
+        self._adopt(draft, write_account_fields(self.name, balance=balance, expected_version=self._version))
 
     def buy_shares(self, symbol: str, quantity: int, rationale: str) -> str:
         """ Buy shares of a stock if sufficient funds are available. """
         price = get_share_price(symbol)
+        self._with_retries(self._buy, symbol, quantity, rationale, price)
+        write_log(self.name, "account", f"Bought {quantity} of {symbol}")
+        return "Completed. Latest details:\n" + self.lean_report()
+
+    def _buy(self, symbol: str, quantity: int, rationale: str, price: float):
+        # Trade on a copy, so this account only changes once the trade has been written
+        draft = self.model_copy(deep=True)
+        self._adopt(draft, draft._write_trade(draft._record_buy(symbol, quantity, rationale, price)))
+
+    def _record_buy(self, symbol: str, quantity: int, rationale: str, price: float) -> Transaction:
+        """ Apply a purchase to this account in memory and return its transaction, without writing it; call it on a draft. """
         buy_price = price * (1 + SPREAD)
         total_cost = buy_price * quantity
         
@@ -87,18 +169,18 @@ class Account(BaseModel):
         elif price==0:
             raise ValueError(f"Unrecognized symbol {symbol}")
         
-        # Update holdings
+        # Update holdings and the running totals
         self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.cost_basis[symbol] = self.cost_basis.get(symbol, 0.0) + total_cost
+        self.net_invested += total_cost
+        timestamp = clock.now().strftime("%Y-%m-%d %H:%M:%S")
         # Record transaction
         transaction = Transaction(symbol=symbol, quantity=quantity, price=buy_price, timestamp=timestamp, rationale=rationale)
         self.transactions.append(transaction)
         
         # Update balance
         self.balance -= total_cost
-        self.save()
-        write_log(self.name, "account", f"Bought {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
+        return transaction
 
     def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
         """ Sell shares of a stock if the user has enough shares. """
@@ -106,37 +188,145 @@ class Account(BaseModel):
             raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
         
         price = get_share_price(symbol)
+        self._with_retries(self._sell, symbol, quantity, rationale, price)
+        write_log(self.name, "account", f"Sold {quantity} of {symbol}")
+        return "Completed. Latest details:\n" + self.lean_report()
+
+    def _sell(self, symbol: str, quantity: int, rationale: str, price: float):
+        draft = self.model_copy(deep=True)
+        self._adopt(draft, draft._write_trade(draft._record_sell(symbol, quantity, rationale, price)))
+
+    def _record_sell(self, symbol: str, quantity: int, rationale: str, price: float) -> Transaction:
+        """ Apply a sale to this account in memory and return its transaction, without writing it; call it on a draft. """
+        if self.holdings.get(symbol, 0) < quantity:
+            raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
+
         sell_price = price * (1 - SPREAD)
         total_proceeds = sell_price * quantity
         
-        # Update holdings
+        # Update holdings and the running totals, taking out the average cost of the shares sold
+        average_cost = self.cost_basis.get(symbol, 0.0) / self.holdings[symbol]
         self.holdings[symbol] -= quantity
+        self.cost_basis[symbol] = self.cost_basis.get(symbol, 0.0) - average_cost * quantity
+        self.realized_pnl += (sell_price - average_cost) * quantity
+        self.net_invested -= total_proceeds
         
         # If shares are completely sold, remove from holdings
         if self.holdings[symbol] == 0:
             del self.holdings[symbol]
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.cost_basis.pop(symbol, None)
+        timestamp = clock.now().strftime("%Y-%m-%d %H:%M:%S")
         # Record transaction
         transaction = Transaction(symbol=symbol, quantity=-quantity, price=sell_price, timestamp=timestamp, rationale=rationale)  # negative quantity for sell
         self.transactions.append(transaction)
 
         # Update balance
         self.balance += total_proceeds
-        self.save()
-        write_log(self.name, "account", f"Sold {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
+        return transaction
+
+    def execute_orders(self, orders: list[dict]) -> str:
+        """
+        Execute a basket of orders, each a dict of side ("buy" or "sell"), symbol, quantity and rationale.
+        Every order is priced from one snapshot and checked before any is applied; then they're recorded
+        together in one transaction, sells first so their proceeds can fund the buys. If any order
+        can't be filled, none are.
+        """
+        if not orders:
+            raise ValueError("No orders to execute.")
+        for order in orders:
+            if order["side"] not in ("buy", "sell"):
+                raise ValueError(f"Unknown side {order['side']} for {order['symbol']}; use buy or sell.")
+            if order["quantity"] <= 0:
+                raise ValueError(f"Quantity for {order['symbol']} must be positive.")
+        prices = get_share_prices([*self.holdings, *(order["symbol"] for order in orders)])
+        ordered = sorted(orders, key=lambda order: order["side"] != "sell")
+        self._with_retries(self._execute_orders, ordered, prices)
+        summary = ", ".join(
+            f"{'Bought' if order['side'] == 'buy' else 'Sold'} {order['quantity']} of {order['symbol']}"
+            for order in ordered
+        )
+        write_log(self.name, "account", summary)
+        # A retry may have reloaded holdings that weren't priced up front
+        missing = [symbol for symbol in self.holdings if symbol not in prices]
+        if missing:
+            prices = {**prices, **get_share_prices(missing)}
+        return "Completed. Latest details:\n" + self.lean_report(prices=prices)
+
+    def _execute_orders(self, orders: list[dict], prices: dict[str, float]):
+        # Work on a copy, so a failing order leaves this account exactly as it was
+        draft = self.model_copy(deep=True)
+        transactions = [
+            (draft._record_buy if order["side"] == "buy" else draft._record_sell)(
+                order["symbol"], order["quantity"], order["rationale"], prices[order["symbol"]]
+            )
+            for order in orders
+        ]
+        version = write_trades(
+            self.name,
+            [transaction.model_dump() for transaction in transactions],
+            {
+                order["symbol"]: (draft.holdings.get(order["symbol"], 0), draft.cost_basis.get(order["symbol"], 0.0))
+                for order in orders
+            },
+            balance=draft.balance,
+            net_invested=draft.net_invested,
+            realized_pnl=draft.realized_pnl,
+            expected_version=self._version,
+        )
+        self._adopt(draft, version)
+
+    def _track_version(self, version: int, draft: "Account | None" = None):
+        """
+        After a write that doesn't need a version check, take on the draft that was written,
+        or reload if someone else had written in between.
+        """
+        if version != self._version + 1:
+            self.refresh()
+        elif draft is not None:
+            self._adopt(draft, version)
+        else:
+            self._version = version
+
+    def _write_trade(self, transaction: Transaction) -> int:
+        symbol = transaction.symbol
+        return write_trade(
+            self.name,
+            transaction.model_dump(),
+            holding=self.holdings.get(symbol, 0),
+            cost_basis=self.cost_basis.get(symbol, 0.0),
+            balance=self.balance,
+            net_invested=self.net_invested,
+            realized_pnl=self.realized_pnl,
+            expected_version=self._version,
+        )
 
-    def calculate_portfolio_value(self):
+    def get_prices(self) -> dict[str, float]:
+        """ Look up the current price of each holding, in a single batched request. """
+        return get_share_prices(list(self.holdings))
+
+    def calculate_portfolio_value(self, prices: dict[str, float] | None = None):
         """ Calculate the total value of the user's portfolio. """
+        prices = self.get_prices() if prices is None else prices
         total_value = self.balance
         for symbol, quantity in self.holdings.items():
-            total_value += get_share_price(symbol) * quantity
+            total_value += prices[symbol] * quantity
         return total_value
 
     def calculate_profit_loss(self, portfolio_value: float):
         """ Calculate profit or loss from the initial spend. """
-        initial_spend = sum(transaction.total() for transaction in self.transactions)
-        return portfolio_value - initial_spend - self.balance
+        return portfolio_value - self.net_invested - self.balance
+
+    def calculate_unrealized_profit_loss(self, prices: dict[str, float] | None = None):
+        """ Calculate the profit or loss on current holdings against their average cost. """
+        prices = self.get_prices() if prices is None else prices
+        return sum(
+            prices[symbol] * quantity - self.cost_basis.get(symbol, 0.0)
+            for symbol, quantity in self.holdings.items()
+        )
+
+    def get_average_costs(self) -> dict[str, float]:
+        """ Report the average price paid per share for each holding. """
+        return {symbol: self.cost_basis.get(symbol, 0.0) / quantity for symbol, quantity in self.holdings.items()}
 
     def get_holdings(self):
         """ Report the current holdings of the user. """
@@ -144,24 +334,83 @@ class Account(BaseModel):
 
     def get_profit_loss(self):
         """ Report the user's profit or loss at any point in time. """
-        return self.calculate_profit_loss()
+        return self.calculate_profit_loss(self.calculate_portfolio_value())
 
     def list_transactions(self):
         """ List all transactions made by the user. """
         return [transaction.model_dump() for transaction in self.transactions]
     
-    def report(self) -> str:
-        """ Return a json string representing the account.  """
-        portfolio_value = self.calculate_portfolio_value()
-        self.portfolio_value_time_series.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value))
-        self.save()
+    def report(self, prices: dict[str, float] | None = None) -> str:
+        """ Return a json string representing the account, optionally valued at prices already looked up. """
+        prices = self.get_prices() if prices is None else prices
+        portfolio_value = self.calculate_portfolio_value(prices)
+        timestamp = clock.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.portfolio_value_time_series.append((timestamp, portfolio_value))
         pnl = self.calculate_profit_loss(portfolio_value)
         data = self.model_dump()
         data["total_portfolio_value"] = portfolio_value
         data["total_profit_loss"] = pnl
+        data["realized_profit_loss"] = self.realized_pnl
+        data["unrealized_profit_loss"] = self.calculate_unrealized_profit_loss(prices)
+        data["average_costs"] = self.get_average_costs()
+        # Written after the report is built, since this may reload the account if another writer got in first
+        self._track_version(write_portfolio_value(self.name, timestamp, portfolio_value))
         write_log(self.name, "account", f"Retrieved account details")
         return json.dumps(data)
     
+    def summary(self, prices: dict[str, float] | None = None) -> dict:
+        """ The account's headline figures, without its holdings or history. """
+        prices = self.get_prices() if prices is None else prices
+        portfolio_value = self.calculate_portfolio_value(prices)
+        return {
+            "name": self.name,
+            "balance": self.balance,
+            "total_portfolio_value": portfolio_value,
+            "total_profit_loss": self.calculate_profit_loss(portfolio_value),
+            "realized_profit_loss": self.realized_pnl,
+            "unrealized_profit_loss": self.calculate_unrealized_profit_loss(prices),
+            "positions": len(self.holdings),
+            "transactions": len(self.transactions),
+        }
+
+    def holdings_report(self, prices: dict[str, float] | None = None) -> dict[str, dict]:
+        """ Each holding with its quantity, cost basis, current price and unrealized P&L. """
+        prices = self.get_prices() if prices is None else prices
+        return {
+            symbol: {
+                "quantity": quantity,
+                "average_cost": self.cost_basis.get(symbol, 0.0) / quantity,
+                "cost_basis": self.cost_basis.get(symbol, 0.0),
+                "price": prices[symbol],
+                "market_value": prices[symbol] * quantity,
+                "unrealized_profit_loss": prices[symbol] * quantity - self.cost_basis.get(symbol, 0.0),
+            }
+            for symbol, quantity in self.holdings.items()
+        }
+
+    def recent_transactions(self, last_n: int = RECENT_TRANSACTIONS) -> list[dict]:
+        """ The last few transactions, oldest first, with long rationales cut short. """
+        recent = self.transactions[-last_n:] if last_n > 0 else []
+        return [
+            {**transaction.model_dump(), "rationale": transaction.rationale[:RATIONALE_CHARS]}
+            for transaction in recent
+        ]
+
+    def lean_report(self, last_n: int = RECENT_TRANSACTIONS, prices: dict[str, float] | None = None) -> str:
+        """
+        Like report(), but the same size however long the account's history: the summary figures,
+        holdings with their cost basis and only the most recent transactions, as compact json.
+        """
+        prices = self.get_prices() if prices is None else prices
+        data = self.summary(prices)
+        data["holdings"] = self.holdings_report(prices)
+        data["recent_transactions"] = self.recent_transactions(last_n)
+        timestamp = clock.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.portfolio_value_time_series.append((timestamp, data["total_portfolio_value"]))
+        self._track_version(write_portfolio_value(self.name, timestamp, data["total_portfolio_value"]))
+        write_log(self.name, "account", f"Retrieved account summary")
+        return compact_json(data)
+
     def get_strategy(self) -> str:
         """ Return the strategy of the account """
         write_log(self.name, "account", f"Retrieved strategy")
@@ -169,11 +418,44 @@ class Account(BaseModel):
     
     def change_strategy(self, strategy: str) -> str:
         """ At your discretion, if you choose to, call this to change your investment strategy for the future """
-        self.strategy = strategy
-        self.save()
+        draft = self.model_copy(deep=True)
+        draft.strategy = strategy
+        self._track_version(write_account_fields(self.name, strategy=strategy), draft)
         write_log(self.name, "account", f"Changed strategy")
         return "Changed strategy"
 
+class AccountCache:
+    """
+    Write-through cache of Account objects by name, for long-lived processes like the accounts server.
+    Account methods persist every change as they make it, so a cached object stays current with our
+    own writes. Writes from other processes are spotted through SQLite's data_version, and then
+    only accounts whose version has moved on are dropped and re-read.
+    """
+
+    def __init__(self):
+        self.accounts: dict[str, Account] = {}
+        self.data_version = None
+
+    def get(self, name: str) -> Account:
+        data_version = read_data_version()
+        if data_version != self.data_version:
+            self.data_version = data_version
+            versions = read_account_versions()
+            for key, account in list(self.accounts.items()):
+                if versions.get(key) != account._version:
+                    del self.accounts[key]
+        key = name.lower()
+        if key not in self.accounts:
+            self.accounts[key] = Account.get(key)
+        return self.accounts[key]
+
+    def invalidate(self, name: str | None = None):
+        if name is None:
+            self.accounts.clear()
+        else:
+            self.accounts.pop(name.lower(), None)
+
+
 # Example of usage:
 if __name__ == "__main__":
     account = Account("John Doe")
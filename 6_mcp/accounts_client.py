@@ -1,39 +1,138 @@
-import mcp
-from mcp.client.stdio import stdio_client
-from mcp import StdioServerParameters
+import anyio
+import asyncio
+from contextlib import asynccontextmanager
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
 from agents import FunctionTool
+from mcp_pool import PooledServer, server_name
 import json
 
-params = StdioServerParameters(command="uv", args=["run", "accounts_server.py"], env=None)
+params = {"command": "uv", "args": ["run", "accounts_server.py"]}
+
+
+class AccountsSession:
+    """
+    A single MCP session with the accounts server, shared by every helper in this module.
+    It starts on first use and closes when the last holder lets go, so a long-lived caller
+    (like the trading floor) holds it open to keep the server up between requests.
+    If the server goes away, the next request reconnects and tries again.
+    The server process itself is a PooledServer, which owns its start and stop.
+    """
+
+    def __init__(self, params: dict):
+        self.server = PooledServer(server_name(params), params)
+        self.refs = 0
+        self.generation = 0
+        self._lock: asyncio.Lock | None = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        # Created on first use, inside the event loop that will use it
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @property
+    def session(self):
+        return self.server.server.session if self.server.running else None
+
+    async def _open(self) -> None:
+        await self.server.start()
+        self.generation += 1
+
+    async def _close(self) -> None:
+        await self.server.stop()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            if self.session is None:
+                await self._close()
+                await self._open()
+            self.refs += 1
+
+    async def release(self) -> None:
+        async with self.lock:
+            self.refs -= 1
+            if self.refs == 0:
+                await self._close()
+
+    async def _reconnect(self, generation: int) -> None:
+        async with self.lock:
+            # If another request has already reconnected, use its session
+            if self.generation == generation:
+                await self._close()
+                await self._open()
+
+    async def request(self, call):
+        """Run call(session), reconnecting and retrying once if the server has gone away"""
+        generation = self.generation
+        if self.session is not None:
+            try:
+                return await call(self.session)
+            except (McpError, anyio.ClosedResourceError, anyio.BrokenResourceError) as e:
+                if isinstance(e, McpError) and e.error.code != CONNECTION_CLOSED:
+                    raise
+                print(f"Lost the accounts server ({e}), reconnecting")
+        await self._reconnect(generation)
+        return await call(self.session)
+
+
+_accounts = AccountsSession(params)
+
+
+@asynccontextmanager
+async def accounts_session():
+    """Hold the shared accounts server session open for the duration of the block"""
+    await _accounts.acquire()
+    try:
+        yield _accounts
+    finally:
+        await _accounts.release()
 
 
 async def list_accounts_tools():
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            tools_result = await session.list_tools()
-            return tools_result.tools
-        
+    async with accounts_session() as client:
+        tools_result = await client.request(lambda session: session.list_tools())
+        return tools_result.tools
+
+
 async def call_accounts_tool(tool_name, tool_args):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.call_tool(tool_name, tool_args)
-            return result
-            
+    async with accounts_session() as client:
+        return await client.request(lambda session: session.call_tool(tool_name, tool_args))
+
+
+async def read_resources(uris: list[str]) -> list[str]:
+    """Read several resources from the accounts server at once, over the one session"""
+    async with accounts_session() as client:
+        results = await asyncio.gather(
+            *[client.request(lambda session, uri=uri: session.read_resource(uri)) for uri in uris]
+        )
+        return [result.contents[0].text for result in results]
+
+
+def account_uri(name):
+    return f"accounts://accounts_server/{name}"
+
+
+def context_uri(name):
+    return f"accounts://context/{name}"
+
+
+def strategy_uri(name):
+    return f"accounts://strategy/{name}"
+
+
 async def read_accounts_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://accounts_server/{name}")
-            return result.contents[0].text
-        
+    return (await read_resources([account_uri(name)]))[0]
+
+
+async def read_context_resource(name):
+    return (await read_resources([context_uri(name)]))[0]
+
+
 async def read_strategy_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://strategy/{name}")
-            return result.contents[0].text
+    return (await read_resources([strategy_uri(name)]))[0]
+
 
 async def get_accounts_tools_openai():
     openai_tools = []
@@ -44,7 +143,7 @@ async def get_accounts_tools_openai():
             description=tool.description,
             params_json_schema=schema,
             on_invoke_tool=lambda ctx, args, toolname=tool.name: call_accounts_tool(toolname, json.loads(args))
-                
+
         )
         openai_tools.append(openai_tool)
-    return openai_tools
\ No newline at end of file
+    return openai_tools
@@ -1,8 +1,28 @@
 from mcp.server.fastmcp import FastMCP
-from accounts import Account
+from contextlib import contextmanager
+from typing import Literal
+from pydantic import BaseModel, ConfigDict
+import json
+from accounts import AccountCache, compact_json
+from analytics import AnalyticsCache, exposure
+from database import read_leaderboard, read_summary_aggregates
 
 mcp = FastMCP("accounts_server")
 
+accounts = AccountCache()
+analytics = AnalyticsCache()
+
+
+@contextmanager
+def cached_account(name: str):
+    """Yield the cached account, dropping it from the cache if anything goes wrong part way through a change"""
+    try:
+        yield accounts.get(name)
+    except Exception:
+        accounts.invalidate(name)
+        raise
+
+
 @mcp.tool()
 async def get_balance(name: str) -> float:
     """Get the cash balance of the given account name.
@@ -10,7 +30,7 @@ async def get_balance(name: str) -> float:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).balance
+    return accounts.get(name).balance
 
 @mcp.tool()
 async def get_holdings(name: str) -> dict[str, int]:
@@ -19,7 +39,7 @@ async def get_holdings(name: str) -> dict[str, int]:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).holdings
+    return accounts.get(name).holdings
 
 @mcp.tool()
 async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> float:
@@ -31,7 +51,8 @@ async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> f
         quantity: The quantity of shares to buy
         rationale: The rationale for the purchase and fit with the account's strategy
     """
-    return Account.get(name).buy_shares(symbol, quantity, rationale)
+    with cached_account(name) as account:
+        return account.buy_shares(symbol, quantity, rationale)
 
 
 @mcp.tool()
@@ -44,7 +65,29 @@ async def sell_shares(name: str, symbol: str, quantity: int, rationale: str) ->
         quantity: The quantity of shares to sell
         rationale: The rationale for the sale and fit with the account's strategy
     """
-    return Account.get(name).sell_shares(symbol, quantity, rationale)
+    with cached_account(name) as account:
+        return account.sell_shares(symbol, quantity, rationale)
+
+class Order(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    side: Literal["buy", "sell"]
+    symbol: str
+    quantity: int
+    rationale: str
+
+
+@mcp.tool()
+async def execute_orders(name: str, orders: list[Order]) -> str:
+    """Buy and sell several stocks in one go, for example to rebalance. All the orders are priced together
+    and either all go through or none do; sells are made first, so their proceeds can pay for the buys.
+
+    Args:
+        name: The name of the account holder
+        orders: The orders, each with its side (buy or sell), symbol, quantity and rationale
+    """
+    with cached_account(name) as account:
+        return account.execute_orders([order.model_dump() for order in orders])
 
 @mcp.tool()
 async def change_strategy(name: str, strategy: str) -> str:
@@ -54,17 +97,81 @@ async def change_strategy(name: str, strategy: str) -> str:
         name: The name of the account holder
         strategy: The new strategy for the account
     """
-    return Account.get(name).change_strategy(strategy)
+    with cached_account(name) as account:
+        return account.change_strategy(strategy)
+
+@mcp.tool()
+async def get_risk_metrics(name: str) -> dict:
+    """Get risk and return figures for the account from its daily portfolio values: total return,
+    annualized volatility and Sharpe ratio, current and maximum drawdown, and beta against SPY.
+
+    Args:
+        name: The name of the account holder
+    """
+    return analytics.risk_metrics(accounts.get(name))
+
+@mcp.tool()
+async def get_exposure(name: str) -> dict:
+    """Get the account's exposure at current prices: each position's market value, portfolio weight
+    and unrealized profit or loss, and how much of the portfolio is in cash.
+
+    Args:
+        name: The name of the account holder
+    """
+    account = accounts.get(name)
+    return exposure(account.holdings, account.get_prices(), account.cost_basis, account.balance)
+
+@mcp.tool()
+async def get_leaderboard(order_by: str = "portfolio_value", limit: int = 10) -> dict:
+    """Rank every account, and get totals across them all, without loading any account.
+
+    Args:
+        order_by: One of portfolio_value, profit_loss, positions or last_trade_at
+        limit: How many of the top accounts to return
+    """
+    return {"leaders": read_leaderboard(order_by, limit), "aggregates": read_summary_aggregates()}
+
+@mcp.resource("accounts://leaderboard")
+async def read_leaderboard_resource() -> str:
+    return json.dumps({"leaders": read_leaderboard(), "aggregates": read_summary_aggregates()})
+
+@mcp.resource("accounts://leaderboard/{order_by}")
+async def read_ranked_leaderboard_resource(order_by: str) -> str:
+    return json.dumps({"leaders": read_leaderboard(order_by), "aggregates": read_summary_aggregates()})
+
+@mcp.resource("accounts://analytics/{name}")
+async def read_analytics_resource(name: str) -> str:
+    account = accounts.get(name)
+    return json.dumps({
+        "risk": analytics.risk_metrics(account),
+        "exposure": exposure(account.holdings, account.get_prices(), account.cost_basis, account.balance),
+    })
 
 @mcp.resource("accounts://accounts_server/{name}")
 async def read_account_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.report()
+    with cached_account(name) as account:
+        return account.report()
+
+@mcp.resource("accounts://context/{name}")
+async def read_context_resource(name: str) -> str:
+    with cached_account(name) as account:
+        return account.lean_report()
+
+@mcp.resource("accounts://summary/{name}")
+async def read_summary_resource(name: str) -> str:
+    return compact_json(accounts.get(name).summary())
+
+@mcp.resource("accounts://holdings/{name}")
+async def read_holdings_resource(name: str) -> str:
+    return compact_json(accounts.get(name).holdings_report())
+
+@mcp.resource("accounts://transactions/{name}/{last_n}")
+async def read_transactions_resource(name: str, last_n: str) -> str:
+    return compact_json(accounts.get(name).recent_transactions(int(last_n)))
 
 @mcp.resource("accounts://strategy/{name}")
 async def read_strategy_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.get_strategy()
+    return accounts.get(name).get_strategy()
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
@@ -0,0 +1,112 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from bar_store import bar_store
+
+load_dotenv(override=True)
+
+TRADING_DAYS = 252
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.0"))
+BENCHMARK = "SPY"
+MIN_RETURNS = 2
+
+
+def daily_closes(series: list[tuple[str, float]]) -> tuple[np.ndarray, np.ndarray]:
+    """Reduce a (datetime, value) series in time order to the last value of each day"""
+    if not series:
+        return np.empty(0, dtype="<U10"), np.empty(0)
+    dates = np.array([datetime[:10] for datetime, _ in series])
+    values = np.array([value for _, value in series], dtype=float)
+    last_of_day = np.append(dates[1:] != dates[:-1], True)
+    return dates[last_of_day], values[last_of_day]
+
+
+def _returns(values: np.ndarray) -> np.ndarray:
+    return np.diff(values) / values[:-1]
+
+
+def risk_metrics(series: list[tuple[str, float]], benchmark: str = BENCHMARK) -> dict:
+    """
+    Daily risk and return figures for a portfolio value series: total return, annualized
+    volatility and Sharpe ratio, current and maximum drawdown, and beta against the benchmark's
+    closes in the local bar store. Figures that need more history than there is are None.
+    """
+    dates, values = daily_closes(series)
+    metrics = {
+        "days": len(values),
+        "total_return": None,
+        "volatility": None,
+        "sharpe": None,
+        "max_drawdown": None,
+        "current_drawdown": None,
+        f"beta_vs_{benchmark.lower()}": None,
+    }
+    if len(values) == 0:
+        return metrics
+
+    peaks = np.maximum.accumulate(values)
+    drawdowns = values / peaks - 1
+    metrics["max_drawdown"] = float(drawdowns.min())
+    metrics["current_drawdown"] = float(drawdowns[-1])
+    metrics["total_return"] = float(values[-1] / values[0] - 1)
+
+    returns = _returns(values)
+    if len(returns) >= MIN_RETURNS:
+        deviation = returns.std(ddof=1)
+        metrics["volatility"] = float(deviation * np.sqrt(TRADING_DAYS))
+        if deviation > 0:
+            excess = returns.mean() - RISK_FREE_RATE / TRADING_DAYS
+            metrics["sharpe"] = float(excess / deviation * np.sqrt(TRADING_DAYS))
+
+    benchmark_dates, benchmark_closes = bar_store.history(benchmark, dates[0], dates[-1])
+    common, ours, theirs = np.intersect1d(dates, np.array(benchmark_dates), return_indices=True)
+    if len(common) > MIN_RETURNS:
+        portfolio_returns = _returns(values[ours])
+        benchmark_returns = _returns(np.asarray(benchmark_closes)[theirs])
+        valid = np.isfinite(benchmark_returns)
+        variance = benchmark_returns[valid].var(ddof=1)
+        if valid.sum() >= MIN_RETURNS and variance > 0:
+            covariance = np.cov(portfolio_returns[valid], benchmark_returns[valid])[0, 1]
+            metrics[f"beta_vs_{benchmark.lower()}"] = float(covariance / variance)
+    return metrics
+
+
+def exposure(holdings: dict[str, int], prices: dict[str, float], cost_basis: dict[str, float], balance: float) -> dict:
+    """Each position's market value, weight in the portfolio and unrealized P&L, plus the cash weight"""
+    symbols = list(holdings)
+    quantities = np.array([holdings[symbol] for symbol in symbols], dtype=float)
+    market_values = quantities * np.array([prices[symbol] for symbol in symbols], dtype=float)
+    costs = np.array([cost_basis.get(symbol, 0.0) for symbol in symbols], dtype=float)
+    total = balance + market_values.sum()
+    weights = market_values / total if total else np.zeros_like(market_values)
+    positions = {
+        symbol: {
+            "market_value": round(float(value), 2),
+            "weight": round(float(weight), 4),
+            "unrealized_pnl": round(float(value - cost), 2),
+        }
+        for symbol, value, weight, cost in zip(symbols, market_values, weights, costs)
+    }
+    return {
+        "portfolio_value": round(float(total), 2),
+        "cash_weight": round(float(balance / total), 4) if total else 0.0,
+        "invested_weight": round(float(weights.sum()), 4),
+        "largest_position_weight": round(float(weights.max()), 4) if len(weights) else 0.0,
+        "positions": positions,
+    }
+
+
+class AnalyticsCache:
+    """Risk metrics for each account, recomputed only when the account's version changes"""
+
+    def __init__(self):
+        self._metrics: dict[str, tuple[int, dict]] = {}
+
+    def risk_metrics(self, account) -> dict:
+        key = account.name.lower()
+        cached = self._metrics.get(key)
+        if cached and cached[0] == account._version:
+            return cached[1]
+        metrics = risk_metrics(account.portfolio_value_time_series)
+        self._metrics[key] = (account._version, metrics)
+        return metrics
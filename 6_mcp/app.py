@@ -1,10 +1,14 @@
 import gradio as gr
 from util import css, js, Color
 import pandas as pd
-from trading_floor import names, lastnames, short_model_names
+import time
+from typing import NamedTuple
+from trading_floor import seed_traders
 import plotly.express as px
 from accounts import Account
-from database import read_log
+from database import read_portfolio_values, read_account_versions, read_leaderboard, read_traders
+from log_feed import log_feed
+from snapshots import SnapshotCache
 
 mapper = {
     "trace": Color.WHITE,
@@ -15,6 +19,19 @@ mapper = {
     "account": Color.RED,
 }
 
+CHART_POINTS = 500
+LOG_WAIT_SECONDS = 30
+REFRESH_SECONDS = 120
+
+snapshots = SnapshotCache()
+
+
+class TraderSnapshot(NamedTuple):
+    portfolio_value: str
+    chart: object
+    holdings: pd.DataFrame
+    transactions: pd.DataFrame
+
 
 class Trader:
     def __init__(self, name: str, lastname: str, model_name: str):
@@ -26,6 +43,23 @@ class Trader:
     def reload(self):
         self.account = Account.get(self.name)
 
+    def stamp(self) -> tuple:
+        """Changes when the account does, and once per refresh period for the live prices"""
+        return read_account_versions().get(self.name.lower()), int(time.time() // REFRESH_SECONDS)
+
+    def build_snapshot(self) -> TraderSnapshot:
+        self.reload()
+        return TraderSnapshot(
+            self.get_portfolio_value(),
+            self.get_portfolio_value_chart(),
+            self.get_holdings_df(),
+            self.get_transactions_df(),
+        )
+
+    def snapshot(self) -> TraderSnapshot:
+        """The trader's view, built once per stamp and shared by every connected page"""
+        return snapshots.get(self.name, self.stamp(), self.build_snapshot)
+
     def get_title(self) -> str:
         return f"<div style='text-align: center;font-size:34px;'>{self.name}<span style='color:#ccc;font-size:24px;'> ({self.model_name}) - {self.lastname}</span></div>"
 
@@ -33,7 +67,8 @@ class Trader:
         return self.account.get_strategy()
 
     def get_portfolio_value_df(self) -> pd.DataFrame:
-        df = pd.DataFrame(self.account.portfolio_value_time_series, columns=["datetime", "value"])
+        series = read_portfolio_values(self.name, max_points=CHART_POINTS)
+        df = pd.DataFrame(series, columns=["datetime", "value"])
         df["datetime"] = pd.to_datetime(df["datetime"])
         return df
 
@@ -80,17 +115,26 @@ class Trader:
         emoji = "⬆" if pnl >= 0 else "⬇"
         return f"<div style='text-align: center;background-color:{color};'><span style='font-size:32px'>${portfolio_value:,.0f}</span><span style='font-size:24px'>&nbsp;&nbsp;&nbsp;{emoji}&nbsp;${pnl:,.0f}</span></div>"
 
-    def get_logs(self, previous=None) -> str:
-        logs = read_log(self.name, last_n=13)
+    def format_logs(self, logs) -> str:
         response = ""
         for log in logs:
             timestamp, type, message = log
             color = mapper.get(type, Color.WHITE).value
             response += f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>"
-        response = f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
-        if response != previous:
-            return response
-        return gr.update()
+        return f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
+
+    def get_logs(self) -> str:
+        _, logs = log_feed.latest(self.name)
+        return self.format_logs(logs)
+
+    async def stream_logs(self):
+        """Push the logs to the page whenever new entries arrive, rather than having the page poll for them"""
+        version = None
+        while True:
+            latest, logs = await log_feed.wait_async(self.name, version, LOG_WAIT_SECONDS)
+            # On a timeout with nothing new we still yield, so a closed page is noticed and the stream ends
+            yield self.format_logs(logs) if latest != version else gr.update()
+            version = latest
 
 
 class TraderView:
@@ -105,16 +149,16 @@ class TraderView:
         with gr.Column():
             gr.HTML(self.trader.get_title())
             with gr.Row():
-                self.portfolio_value = gr.HTML(self.trader.get_portfolio_value)
+                self.portfolio_value = gr.HTML(lambda: self.trader.snapshot().portfolio_value)
             with gr.Row():
                 self.chart = gr.Plot(
-                    self.trader.get_portfolio_value_chart, container=True, show_label=False
+                    lambda: self.trader.snapshot().chart, container=True, show_label=False
                 )
             with gr.Row(variant="panel"):
                 self.log = gr.HTML(self.trader.get_logs)
             with gr.Row():
                 self.holdings_table = gr.Dataframe(
-                    value=self.trader.get_holdings_df,
+                    value=lambda: self.trader.snapshot().holdings,
                     label="Holdings",
                     headers=["Symbol", "Quantity"],
                     row_count=(5, "dynamic"),
@@ -124,7 +168,7 @@ class TraderView:
                 )
             with gr.Row():
                 self.transactions_table = gr.Dataframe(
-                    value=self.trader.get_transactions_df,
+                    value=lambda: self.trader.snapshot().transactions,
                     label="Recent Transactions",
                     headers=["Timestamp", "Symbol", "Quantity", "Price", "Rationale"],
                     row_count=(5, "dynamic"),
@@ -133,7 +177,7 @@ class TraderView:
                     elem_classes=["dataframe-fix"],
                 )
 
-        timer = gr.Timer(value=120)
+        timer = gr.Timer(value=REFRESH_SECONDS)
         timer.tick(
             fn=self.refresh,
             inputs=[],
@@ -146,41 +190,63 @@ class TraderView:
             show_progress="hidden",
             queue=False,
         )
-        log_timer = gr.Timer(value=0.5)
-        log_timer.tick(
-            fn=self.trader.get_logs,
-            inputs=[self.log],
-            outputs=[self.log],
-            show_progress="hidden",
-            queue=False,
-        )
 
     def refresh(self):
-        self.trader.reload()
-        return (
-            self.trader.get_portfolio_value(),
-            self.trader.get_portfolio_value_chart(),
-            self.trader.get_holdings_df(),
-            self.trader.get_transactions_df(),
-        )
+        return tuple(self.trader.snapshot())
+
+
+def get_leaderboard_df(names: list[str]) -> pd.DataFrame:
+    """The traders ranked by portfolio value, straight from the summary rows"""
+    leaders = read_leaderboard(limit=len(names), names=names)
+    return pd.DataFrame(
+        [
+            {
+                "Rank": leader["rank"],
+                "Trader": leader["name"].title(),
+                "Value": f"${leader['portfolio_value']:,.0f}",
+                "P&L": f"${leader['profit_loss']:,.0f}",
+                "Positions": leader["positions"],
+                "Last Trade": leader["last_trade_at"] or "",
+            }
+            for leader in leaders
+        ],
+        columns=["Rank", "Trader", "Value", "P&L", "Positions", "Last Trade"],
+    )
 
 
 # Main UI construction
 def create_ui():
     """Create the main Gradio UI for the trading simulation"""
 
+    # The same roster the trading floor runs, so traders added or changed in the table show up here
+    seed_traders()
     traders = [
-        Trader(trader_name, lastname, model_name)
-        for trader_name, lastname, model_name in zip(names, lastnames, short_model_names)
+        Trader(definition["name"], definition["lastname"], definition["short_model_name"])
+        for definition in read_traders()
     ]
     trader_views = [TraderView(trader) for trader in traders]
+    names = [trader.name for trader in traders]
 
     with gr.Blocks(
         title="Traders", css=css, js=js, theme=gr.themes.Default(primary_hue="sky"), fill_width=True
     ) as ui:
+        with gr.Row():
+            leaderboard = gr.Dataframe(value=lambda: get_leaderboard_df(names), label="Leaderboard", max_height=200)
+        gr.Timer(value=REFRESH_SECONDS).tick(
+            fn=lambda: get_leaderboard_df(names), inputs=[], outputs=[leaderboard], show_progress="hidden", queue=False
+        )
         with gr.Row():
             for trader_view in trader_views:
                 trader_view.make_ui()
+        # Each page gets a long-lived stream per trader; they're async and mostly sleep on the event loop
+        # without holding a worker thread, so don't cap how many run at once
+        for trader_view in trader_views:
+            ui.load(
+                trader_view.trader.stream_logs,
+                outputs=[trader_view.log],
+                show_progress="hidden",
+                concurrency_limit=None,
+            )
 
     return ui
 
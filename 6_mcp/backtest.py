@@ -0,0 +1,265 @@
+"""
+Deterministic offline replay of the trading floor.
+
+Drives Trader.run() over a range of historical dates with a simulated clock, a pluggable price
+source (recorded bars from the local bar store, or a seeded random walk) and a stub model that
+places trades without calling an LLM. No network, no MCP servers, and the same seed gives the
+same trades and P&L path every time.
+
+Run with: uv run backtest.py 2024-01-01 2024-06-30 --source random --seed 42
+"""
+
+import os
+
+# Replays use their own database, chosen before anything opens accounts.db
+os.environ.setdefault("ACCOUNTS_DB", "backtest.db")
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+from itertools import count
+from agents import Agent, Model, ModelResponse, Usage, function_tool, set_tracing_disabled
+from openai.types.responses import ResponseFunctionToolCall, ResponseOutputMessage, ResponseOutputText
+import clock
+import market
+from accounts import AccountCache, INITIAL_BALANCE
+from bar_store import bar_store
+from reset import waren_strategy, george_strategy, ray_strategy, cathie_strategy
+from traders import Trader
+from trading_floor import names, lastnames
+
+DEFAULT_SYMBOLS = ["SPY", "QQQ", "AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "BRK.B"]
+STRATEGIES = [waren_strategy, george_strategy, ray_strategy, cathie_strategy]
+
+accounts = AccountCache()
+
+
+# Price sources: each returns prices as of the simulated clock
+
+
+class RandomWalkPriceSource:
+    """Seeded geometric random walk per symbol, one step per trading day since the start date"""
+
+    def __init__(self, symbols: list[str], start: date, seed: int = 0, volatility: float = 0.02):
+        self.symbols = symbols
+        self.start = start
+        self.seed = seed
+        self.volatility = volatility
+        self.paths: dict[str, list[float]] = {}
+        self.generators: dict[str, random.Random] = {}
+
+    def _price(self, symbol: str, step: int) -> float:
+        if symbol not in self.paths:
+            # Each symbol has its own generator, so paths don't depend on the order of lookups
+            self.generators[symbol] = random.Random(f"{self.seed}-{symbol}")
+            self.paths[symbol] = [round(self.generators[symbol].uniform(20, 500), 2)]
+        path, rng = self.paths[symbol], self.generators[symbol]
+        while len(path) <= step:
+            path.append(round(path[-1] * (1 + rng.gauss(0.0003, self.volatility)), 2))
+        return path[step]
+
+    def get_share_prices(self, symbols: list[str]) -> dict[str, float]:
+        step = max(0, (clock.now().date() - self.start).days)
+        return {symbol: self._price(symbol, step) if symbol in self.symbols else 0.0 for symbol in symbols}
+
+
+class BarPriceSource:
+    """Closes recorded in the local bar store, as of the simulated date"""
+
+    def __init__(self, symbols: list[str]):
+        self.symbols = symbols
+
+    def get_share_prices(self, symbols: list[str]) -> dict[str, float]:
+        today = clock.now().date()
+        return {symbol: bar_store.price(symbol, today) or 0.0 for symbol in symbols}
+
+
+# Tools the stub model can call, backed directly by the accounts in this process.
+# They are async so the SDK runs them in order on the event loop rather than racing in threads.
+
+
+@function_tool
+async def get_holdings(name: str) -> dict[str, int]:
+    """Get the holdings of the given account name."""
+    return accounts.get(name).holdings
+
+
+@function_tool
+async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> str:
+    """Buy shares of a stock."""
+    return accounts.get(name).buy_shares(symbol, quantity, rationale)
+
+
+@function_tool
+async def sell_shares(name: str, symbol: str, quantity: int, rationale: str) -> str:
+    """Sell shares of a stock."""
+    return accounts.get(name).sell_shares(symbol, quantity, rationale)
+
+
+TOOLS = [get_holdings, buy_shares, sell_shares]
+
+
+class StubModel(Model):
+    """
+    Stands in for the LLM: on each run it places a few seeded random orders through the tools,
+    then replies with a one-line summary once the tool results come back.
+    """
+
+    def __init__(self, name: str, symbols: list[str], seed: int, max_orders: int = 3):
+        self.name = name
+        self.symbols = symbols
+        self.rng = random.Random(f"{seed}-{name}")
+        self.max_orders = max_orders
+        self.calls = count()
+
+    def _orders(self) -> list[ResponseFunctionToolCall]:
+        account = accounts.get(self.name)
+        orders = []
+        for _ in range(self.rng.randint(1, self.max_orders)):
+            held = sorted(account.holdings)
+            if held and self.rng.random() < 0.4:
+                symbol = self.rng.choice(held)
+                tool = "sell_shares"
+                quantity = self.rng.randint(1, account.holdings[symbol])
+            else:
+                symbol = self.rng.choice(self.symbols)
+                tool = "buy_shares"
+                quantity = self.rng.randint(1, 10)
+            arguments = {"name": self.name, "symbol": symbol, "quantity": quantity, "rationale": "replay"}
+            orders.append(ResponseFunctionToolCall(
+                type="function_call",
+                id=f"fc_{self.name}_{next(self.calls)}",
+                call_id=f"call_{self.name}_{next(self.calls)}",
+                name=tool,
+                arguments=json.dumps(arguments),
+            ))
+        return orders
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        finished = isinstance(input, list) and input and _item_type(input[-1]) == "function_call_output"
+        if finished:
+            text = ResponseOutputText(type="output_text", text="Trades placed.", annotations=[])
+            output = [ResponseOutputMessage(
+                type="message", id=f"msg_{self.name}_{next(self.calls)}", role="assistant", status="completed", content=[text]
+            )]
+        else:
+            output = self._orders()
+        return ModelResponse(output=output, usage=Usage(), response_id=None)
+
+    def stream_response(self, *args, **kwargs):
+        raise NotImplementedError("The stub model doesn't stream")
+
+
+def _item_type(item) -> str | None:
+    return item.get("type") if isinstance(item, dict) else getattr(item, "type", None)
+
+
+class ReplayTrader(Trader):
+    """A Trader whose agent runs on the stub model against in-process tools instead of MCP servers"""
+
+    def __init__(self, name: str, lastname: str, symbols: list[str], seed: int):
+        super().__init__(name, lastname, model_name="stub")
+        self.model = StubModel(name, symbols, seed)
+
+    async def create_agent(self, trader_mcp_servers, researcher_mcp_servers) -> Agent:
+        self.agent = Agent(name=self.name, instructions="Replay", model=self.model, tools=TOOLS)
+        return self.agent
+
+    async def get_account_report(self) -> str:
+        return accounts.get(self.name).model_dump_json(exclude={"portfolio_value_time_series"})
+
+    async def get_strategy(self) -> str:
+        return accounts.get(self.name).strategy
+
+    async def run_with_mcp_servers(self):
+        await self.run_agent([], [])
+
+
+def trading_days(start: date, end: date):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+async def run_backtest(
+    start: date,
+    end: date,
+    source: str = "random",
+    symbols: list[str] = DEFAULT_SYMBOLS,
+    seed: int = 0,
+    runs_per_day: int = 2,
+) -> dict:
+    """Replay the floor from start to end; returns throughput and each trader's value path"""
+    set_tracing_disabled(True)
+    simulated = clock.SimulatedClock(datetime.combine(start, datetime.min.time()))
+    clock.set_clock(simulated)
+    prices = RandomWalkPriceSource(symbols, start, seed) if source == "random" else BarPriceSource(symbols)
+    market.set_price_source(prices)
+
+    traders = [ReplayTrader(name, lastname, symbols, seed) for name, lastname in zip(names, lastnames)]
+    for trader, strategy in zip(traders, STRATEGIES):
+        accounts.get(trader.name).reset(strategy)
+
+    paths = {trader.name: [] for trader in traders}
+    runs = 0
+    began = time.perf_counter()
+    try:
+        for day in trading_days(start, end):
+            simulated.set(datetime.combine(day, datetime.min.time()) + timedelta(hours=10))
+            for _ in range(runs_per_day):
+                await asyncio.gather(*[trader.run() for trader in traders])
+                runs += len(traders)
+                simulated.advance(hours=6 / runs_per_day)
+            for trader in traders:
+                account = accounts.get(trader.name)
+                paths[trader.name].append((day.isoformat(), account.calculate_portfolio_value()))
+    finally:
+        clock.set_clock(None)
+        market.set_price_source(None)
+    elapsed = time.perf_counter() - began
+
+    trades = sum(len(accounts.get(trader.name).transactions) for trader in traders)
+    return {
+        "days": len(next(iter(paths.values()), [])),
+        "runs": runs,
+        "trades": trades,
+        "seconds": elapsed,
+        "runs_per_second": runs / elapsed if elapsed else 0.0,
+        "paths": paths,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the trading floor offline over historical dates")
+    parser.add_argument("start", help="first date, YYYY-MM-DD")
+    parser.add_argument("end", help="last date, YYYY-MM-DD")
+    parser.add_argument("--source", choices=["random", "bars"], default="random")
+    parser.add_argument("--symbols", default=",".join(DEFAULT_SYMBOLS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs-per-day", type=int, default=2)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_backtest(
+        date.fromisoformat(args.start),
+        date.fromisoformat(args.end),
+        source=args.source,
+        symbols=args.symbols.split(","),
+        seed=args.seed,
+        runs_per_day=args.runs_per_day,
+    ))
+    print(
+        f"Replayed {result['days']} days, {result['runs']} trader runs and {result['trades']} trades "
+        f"in {result['seconds']:.1f}s ({result['runs_per_second']:.1f} runs/s)"
+    )
+    for name, path in result["paths"].items():
+        final = path[-1][1] if path else INITIAL_BALANCE
+        print(f"{name}: ${final:,.2f} ({final - INITIAL_BALANCE:+,.2f})")
+
+
+if __name__ == "__main__":
+    main()
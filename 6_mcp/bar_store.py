@@ -0,0 +1,246 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+from datetime import date as Date, datetime
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+BAR_STORE_DIR = os.getenv("BAR_STORE_DIR", "market_data")
+FIELDS = ["open", "high", "low", "close", "volume"]
+EPOCH = Date(1970, 1, 1)
+# Room for this many tickers is set aside in every row, doubling whenever the market outgrows it
+MIN_COLUMNS = 1024
+# How far back an as-of lookup goes for a symbol that has no bar on the date asked for
+AS_OF_LOOKBACK_DAYS = 30
+
+
+def _day(value) -> int:
+    """Days since the epoch for a date, datetime or "YYYY-MM-DD" string"""
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], "%Y-%m-%d").date()
+    elif isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+def _date(day: int) -> str:
+    return Date.fromordinal(EPOCH.toordinal() + int(day)).strftime("%Y-%m-%d")
+
+
+def _capacity_for(tickers: int) -> int:
+    capacity = MIN_COLUMNS
+    while capacity < tickers:
+        capacity *= 2
+    return capacity
+
+
+class BarStore:
+    """
+    Daily OHLCV bars for the whole market, stored column by column as NumPy arrays on disk.
+    Each field is a (days x tickers) matrix of float64 in its own raw file, memory-mapped on
+    read, so a symbol's history is a column slice and a cross-sectional snapshot is a single
+    row; neither needs parsing. Missing bars are NaN.
+
+    Rows are kept in the order days were added, with room for more tickers than are known,
+    so adding a day appends one row to each file rather than rewriting them. Only when the
+    ticker count outgrows that room are the files copied, into new ones twice as wide.
+    meta.json lists the days, tickers and row width, and is replaced last on every write,
+    so readers always see a consistent store. Writers hold a lock file, so several processes
+    can add days safely.
+    """
+
+    def __init__(self, root: str = BAR_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._days = np.empty(0, dtype=np.int32)
+        self._order = np.empty(0, dtype=np.intp)
+        self._sorted = np.empty(0, dtype=np.int32)
+        self._tickers: list[str] = []
+        self._index: dict[str, int] = {}
+        self._capacity = 0
+        self._columns: dict[str, np.ndarray] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _field_path(self, field: str, capacity: int) -> str:
+        return self._path(f"{field}.{capacity}.bin")
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive access for a writer, against other threads and other processes"""
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self._path(".lock"), "a+b") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    else:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load(self) -> None:
+        """(Re)open the files if another writer has changed the store since we last looked"""
+        try:
+            stat = os.stat(self._path("meta.json"))
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp == self._stamp:
+            return
+        with open(self._path("meta.json")) as f:
+            meta = json.load(f)
+        self._tickers = meta["tickers"]
+        self._index = {ticker: i for i, ticker in enumerate(self._tickers)}
+        self._days = np.array(meta["days"], dtype=np.int32)
+        self._order = np.argsort(self._days, kind="stable")
+        self._sorted = self._days[self._order]
+        self._capacity = meta["capacity"]
+        shape = (len(self._days), self._capacity)
+        self._columns = {
+            field: np.memmap(self._field_path(field, self._capacity), dtype=np.float64, mode="r", shape=shape)
+            if len(self._days) else np.empty(shape)
+            for field in FIELDS
+        }
+        self._stamp = stamp
+
+    def _write_meta(self, days: list[int], tickers: list[str], capacity: int) -> None:
+        temp = self._path(".meta.tmp.json")
+        with open(temp, "w") as f:
+            json.dump({"days": days, "tickers": tickers, "capacity": capacity}, f)
+        os.replace(temp, self._path("meta.json"))
+        self._stamp = None
+
+    def _grow(self, capacity: int) -> None:
+        """Copy every field into new files with rows wide enough for capacity tickers"""
+        for field in FIELDS:
+            matrix = np.full((len(self._days), capacity), np.nan)
+            matrix[:, : self._capacity] = self._columns[field]
+            matrix.tofile(self._field_path(field, capacity))
+
+    def add_day(self, day, bars: dict[str, dict[str, float]]) -> None:
+        """
+        Store one trading day of bars, given as {ticker: {"open": ..., "close": ..., ...}}.
+        Replaces that day if it is already stored; new tickers get NaN for earlier days.
+        """
+        with self._writing():
+            self._load()
+            tickers = self._tickers + sorted(set(bars) - set(self._index))
+            index = {ticker: i for i, ticker in enumerate(tickers)}
+            old_capacity = self._capacity
+            capacity = max(old_capacity, _capacity_for(len(tickers)))
+            if capacity != old_capacity and len(self._days):
+                self._grow(capacity)
+
+            target = _day(day)
+            days = [int(d) for d in self._days]
+            row = days.index(target) if target in days else len(days)
+            if row == len(days):
+                days.append(target)
+
+            columns = [index[ticker] for ticker in bars]
+            for field in FIELDS:
+                values = np.full(capacity, np.nan)
+                values[columns] = [bar.get(field, np.nan) for bar in bars.values()]
+                path = self._field_path(field, capacity)
+                with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+                    f.seek(row * capacity * values.itemsize)
+                    f.write(values.tobytes())
+
+            # Written last: until meta.json is replaced, readers see the store as it was
+            self._write_meta(days, tickers, capacity)
+            self._columns = {}
+            if capacity != old_capacity:
+                for field in FIELDS:
+                    try:
+                        os.remove(self._field_path(field, old_capacity))
+                    except OSError:
+                        # Never written, or still mapped by a reader on Windows; it's unused either way
+                        pass
+            self._load()
+
+    def dates(self) -> list[str]:
+        self._load()
+        return [_date(day) for day in self._sorted]
+
+    def has_day(self, day) -> bool:
+        return self._exact_row(day) is not None
+
+    def _exact_row(self, day) -> int | None:
+        self._load()
+        target = _day(day)
+        position = int(np.searchsorted(self._sorted, target))
+        if position < len(self._sorted) and self._sorted[position] == target:
+            return int(self._order[position])
+        return None
+
+    def _rows_as_of(self, day) -> np.ndarray:
+        """The rows from AS_OF_LOOKBACK_DAYS before a date up to the date itself, in date order"""
+        target = _day(day)
+        first = int(np.searchsorted(self._sorted, target - AS_OF_LOOKBACK_DAYS))
+        last = int(np.searchsorted(self._sorted, target, side="right"))
+        return self._order[first:last]
+
+    def price(self, symbol: str, day, field: str = "close", as_of: bool = True) -> float | None:
+        """A symbol's bar value on a date; with as_of, from its latest bar on or before the date"""
+        self._load()
+        column = self._index.get(symbol)
+        if column is None:
+            return None
+        if as_of:
+            values = self._columns[field][self._rows_as_of(day), column]
+            present = np.flatnonzero(~np.isnan(values))
+            return float(values[present[-1]]) if len(present) else None
+        row = self._exact_row(day)
+        if row is None:
+            return None
+        value = float(self._columns[field][row, column])
+        return None if np.isnan(value) else value
+
+    def snapshot(self, day, field: str = "close", as_of: bool = True) -> dict[str, float]:
+        """Every ticker's bar value on a date; with as_of, each from its latest bar on or before the date"""
+        self._load()
+        if as_of:
+            rows = self._rows_as_of(day)
+            if not len(rows):
+                return {}
+            block = np.asarray(self._columns[field][rows, : len(self._tickers)])
+            valid = ~np.isnan(block)
+            latest = len(rows) - 1 - np.argmax(valid[::-1], axis=0)
+            values = block[latest, np.arange(block.shape[1])]
+            present = np.flatnonzero(valid.any(axis=0))
+        else:
+            row = self._exact_row(day)
+            if row is None:
+                return {}
+            values = np.asarray(self._columns[field][row, : len(self._tickers)])
+            present = np.flatnonzero(~np.isnan(values))
+        return {self._tickers[i]: float(values[i]) for i in present}
+
+    def history(self, symbol: str, start=None, end=None, field: str = "close") -> tuple[list[str], np.ndarray]:
+        """A symbol's bar values over a date range, as (dates, values)"""
+        self._load()
+        column = self._index.get(symbol)
+        if column is None:
+            return [], np.empty(0)
+        first = int(np.searchsorted(self._sorted, _day(start))) if start else 0
+        last = int(np.searchsorted(self._sorted, _day(end), side="right")) if end else len(self._sorted)
+        values = np.asarray(self._columns[field][self._order[first:last], column])
+        return [_date(day) for day in self._sorted[first:last]], values
+
+
+bar_store = BarStore()
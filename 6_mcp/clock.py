@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+
+class SimulatedClock:
+    """A clock that only moves when told to, for replaying the trading floor over historical dates"""
+
+    def __init__(self, start: datetime):
+        self.current = start
+
+    def __call__(self) -> datetime:
+        return self.current
+
+    def advance(self, **kwargs) -> datetime:
+        self.current += timedelta(**kwargs)
+        return self.current
+
+    def set(self, when: datetime) -> datetime:
+        self.current = when
+        return self.current
+
+
+_clock = None
+
+
+def now() -> datetime:
+    """The current time: the wall clock, unless a simulated clock has been installed"""
+    return _clock() if _clock else datetime.now()
+
+
+def set_clock(clock) -> None:
+    """Install a callable returning the current datetime, or None to go back to the wall clock"""
+    global _clock
+    _clock = clock
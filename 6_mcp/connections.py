@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+import atexit
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+DB = os.getenv("ACCOUNTS_DB", "accounts.db")
+
+# Several processes share accounts.db (the trading floor, each MCP server and the UI),
+# so we run it in WAL mode: readers never block the writer and commits only append to the log
+
+BUSY_TIMEOUT_MS = 5_000
+MMAP_SIZE = 256 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": BUSY_TIMEOUT_MS,
+    "mmap_size": MMAP_SIZE,
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+_local = threading.local()
+_all_connections: list[sqlite3.Connection] = []
+_registry_lock = threading.Lock()
+
+
+def _open(path: str) -> sqlite3.Connection:
+    """
+    Open a connection in autocommit mode with our pragmas applied.
+    Transactions are started explicitly with transaction(), and the statement cache
+    means each distinct SQL string is only prepared once per connection.
+    """
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={value}")
+    with _registry_lock:
+        _all_connections.append(conn)
+    return conn
+
+
+def get_connection(path: str = DB) -> sqlite3.Connection:
+    """
+    Return this thread's pooled connection to the database, opening it on first use.
+    Connections are never shared across threads, and a forked child opens its own.
+    """
+    pool = getattr(_local, "pool", None)
+    if pool is None or getattr(_local, "pid", None) != os.getpid():
+        pool = _local.pool = {}
+        _local.pid = os.getpid()
+    conn = pool.get(path)
+    if conn is None:
+        conn = pool[path] = _open(path)
+    return conn
+
+
+@contextmanager
+def transaction(path: str = DB, immediate: bool = False):
+    """
+    Run a block of statements in a single transaction on this thread's connection.
+    Use immediate=True to take the write lock up front (BEGIN IMMEDIATE) for read-modify-write.
+    Nested calls join the outer transaction.
+    """
+    conn = get_connection(path)
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+def close_connection(path: str = DB) -> None:
+    """Close this thread's connection to the database, if it has one."""
+    pool = getattr(_local, "pool", None) or {}
+    conn = pool.pop(path, None)
+    if conn is not None:
+        with _registry_lock:
+            if conn in _all_connections:
+                _all_connections.remove(conn)
+        conn.close()
+
+
+@atexit.register
+def close_all() -> None:
+    """Close every connection this process has opened, checkpointing the WAL."""
+    with _registry_lock:
+        connections = list(_all_connections)
+        _all_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            # Connections created in other threads can only be closed by their owner
+            pass
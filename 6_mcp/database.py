@@ -1,17 +1,15 @@
-import sqlite3
 import json
-from datetime import datetime
+import time
 from dotenv import load_dotenv
+from connections import DB, get_connection, transaction
+from log_writer import LogWriter
 
 load_dotenv(override=True)
 
-DB = "accounts.db"
 
-
-with sqlite3.connect(DB) as conn:
-    cursor = conn.cursor()
-    cursor.execute('CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)')
-    cursor.execute('''
+with transaction() as conn:
+    conn.execute('CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)')
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT,
@@ -20,45 +18,567 @@ with sqlite3.connect(DB) as conn:
             message TEXT
         )
     ''')
-    cursor.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
-    conn.commit()
-
-def write_account(name, account_dict):
-    json_data = json.dumps(account_dict)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO accounts (name, account)
-            VALUES (?, ?)
-            ON CONFLICT(name) DO UPDATE SET account=excluded.account
-        ''', (name.lower(), json_data))
-        conn.commit()
+    conn.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
+
+
+# Accounts are stored normalized: one row per account in accounts (cash and strategy), plus
+# holdings, transactions and portfolio_values tables, so a trade is a couple of row writes
+# instead of re-serializing the whole account. The account column holds the legacy JSON blob.
+
+def _replace_account(conn, name, account_dict):
+    name = name.lower()
+    conn.execute('''
+        INSERT INTO accounts (name, account, balance, strategy)
+        VALUES (?, NULL, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET account=NULL, balance=excluded.balance, strategy=excluded.strategy
+    ''', (name, account_dict["balance"], account_dict["strategy"]))
+    for table in ("holdings", "transactions", "portfolio_values"):
+        conn.execute(f'DELETE FROM {table} WHERE name = ?', (name,))
+    conn.executemany(
+        'INSERT INTO holdings (name, symbol, quantity) VALUES (?, ?, ?)',
+        [(name, symbol, quantity) for symbol, quantity in account_dict["holdings"].items()],
+    )
+    conn.executemany(
+        'INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale) VALUES (?, ?, ?, ?, ?, ?)',
+        [
+            (name, t["symbol"], t["quantity"], t["price"], t["timestamp"], t["rationale"])
+            for t in account_dict["transactions"]
+        ],
+    )
+    conn.executemany(
+        'INSERT INTO portfolio_values (name, datetime, value) VALUES (?, ?, ?)',
+        [(name, dt, value) for dt, value in account_dict["portfolio_value_time_series"]],
+    )
+
+def migrate_account_blobs(conn) -> int:
+    """Explode any accounts still stored as a single JSON blob into the normalized tables"""
+    rows = conn.execute('SELECT name, account FROM accounts WHERE account IS NOT NULL').fetchall()
+    for name, blob in rows:
+        _replace_account(conn, name, json.loads(blob))
+    return len(rows)
+
+
+# Schema migrations, applied in order; PRAGMA user_version records how many have run
+
+def _index_logs_by_name(conn):
+    # id is the rowid and only ever increases, so (name, id) gives each trader's logs in
+    # insertion order and read_log becomes a short backwards index scan
+    conn.execute('CREATE INDEX IF NOT EXISTS logs_name_id ON logs (name, id)')
+
+def _normalize_accounts(conn):
+    conn.execute('ALTER TABLE accounts ADD COLUMN balance REAL')
+    conn.execute('ALTER TABLE accounts ADD COLUMN strategy TEXT')
+    conn.execute('''
+        CREATE TABLE holdings (
+            name TEXT,
+            symbol TEXT,
+            quantity INTEGER,
+            PRIMARY KEY (name, symbol)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            symbol TEXT,
+            quantity INTEGER,
+            price REAL,
+            timestamp TEXT,
+            rationale TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX transactions_name_id ON transactions (name, id)')
+    conn.execute('''
+        CREATE TABLE portfolio_values (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            datetime TEXT,
+            value REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX portfolio_values_name_id ON portfolio_values (name, id)')
+    migrated = migrate_account_blobs(conn)
+    if migrated:
+        print(f"Migrated {migrated} accounts to normalized tables")
+
+def _index_portfolio_values_by_time(conn):
+    # Covering index for time range queries and downsampling, which never touch the table itself
+    conn.execute('CREATE INDEX portfolio_values_name_datetime ON portfolio_values (name, datetime, value)')
+
+def _version_accounts(conn):
+    # Bumped on every write to an account, so readers can tell when a copy they hold is stale
+    conn.execute('ALTER TABLE accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+def _write_aggregates(conn, name, account_dict):
+    conn.execute(
+        'UPDATE accounts SET net_invested = ?, realized_pnl = ? WHERE name = ?',
+        (account_dict.get("net_invested", 0.0), account_dict.get("realized_pnl", 0.0), name.lower()),
+    )
+    conn.executemany(
+        'UPDATE holdings SET cost_basis = ? WHERE name = ? AND symbol = ?',
+        [(cost, name.lower(), symbol) for symbol, cost in account_dict.get("cost_basis", {}).items()],
+    )
+
+def _replay_aggregates(conn, name) -> dict:
+    """Rebuild the running totals for an account by replaying its transactions, using average cost"""
+    quantities, cost_basis, net_invested, realized_pnl = {}, {}, 0.0, 0.0
+    rows = conn.execute('SELECT symbol, quantity, price FROM transactions WHERE name = ? ORDER BY id', (name,))
+    for symbol, quantity, price in rows:
+        net_invested += quantity * price
+        held = quantities.get(symbol, 0)
+        if quantity > 0:
+            cost_basis[symbol] = cost_basis.get(symbol, 0.0) + quantity * price
+        elif held:
+            average_cost = cost_basis.get(symbol, 0.0) / held
+            cost_basis[symbol] = cost_basis.get(symbol, 0.0) + quantity * average_cost
+            realized_pnl += -quantity * (price - average_cost)
+        quantities[symbol] = held + quantity
+        if not quantities[symbol]:
+            cost_basis.pop(symbol, None)
+    return {"net_invested": net_invested, "realized_pnl": realized_pnl, "cost_basis": cost_basis}
+
+def _track_cost_basis(conn):
+    # Running totals kept up to date on every trade, so P&L never needs to scan the transaction history
+    conn.execute('ALTER TABLE accounts ADD COLUMN net_invested REAL NOT NULL DEFAULT 0')
+    conn.execute('ALTER TABLE accounts ADD COLUMN realized_pnl REAL NOT NULL DEFAULT 0')
+    conn.execute('ALTER TABLE holdings ADD COLUMN cost_basis REAL NOT NULL DEFAULT 0')
+    for (name,) in conn.execute('SELECT name FROM accounts').fetchall():
+        _write_aggregates(conn, name, _replay_aggregates(conn, name))
+
+def _cache_prices(conn):
+    # Recently fetched share prices, shared by every process that looks prices up
+    conn.execute('CREATE TABLE prices (symbol TEXT PRIMARY KEY, price REAL, fetched_at REAL) WITHOUT ROWID')
+
+def _define_traders(conn):
+    # Who trades on the floor, so the roster can grow without code changes
+    conn.execute('''
+        CREATE TABLE traders (
+            name TEXT PRIMARY KEY,
+            lastname TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            short_model_name TEXT NOT NULL,
+            enabled INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE shard_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            datetime DATETIME,
+            host TEXT,
+            shard INTEGER,
+            traders INTEGER,
+            failures INTEGER,
+            seconds REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX shard_metrics_time ON shard_metrics (datetime)')
+
+def _record_span_latency(conn):
+    # Histograms of how long each kind of span takes for each trader, one row per bucket
+    conn.execute('''
+        CREATE TABLE span_latency (
+            name TEXT,
+            type TEXT,
+            le REAL,
+            count INTEGER NOT NULL,
+            total_seconds REAL NOT NULL,
+            max_seconds REAL NOT NULL,
+            PRIMARY KEY (name, type, le)
+        ) WITHOUT ROWID
+    ''')
+
+def _write_summary(conn, name):
+    """
+    Recompute one account's summary row from its account row, the latest reported value and a couple
+    of index lookups. Until the first report, the account is valued at cost, so its P&L is zero.
+    """
+    conn.execute('''
+        INSERT INTO account_summaries
+            (name, portfolio_value, profit_loss, balance, positions, last_trade_at, valued_at, version)
+        SELECT name, value, value - net_invested - balance, balance, positions, last_trade_at, valued_at, version
+        FROM (
+            SELECT a.name, a.balance, a.net_invested, a.version,
+                COALESCE(
+                    (SELECT value FROM portfolio_values WHERE name = a.name ORDER BY id DESC LIMIT 1),
+                    a.balance + a.net_invested
+                ) AS value,
+                (SELECT datetime FROM portfolio_values WHERE name = a.name ORDER BY id DESC LIMIT 1) AS valued_at,
+                (SELECT COUNT(*) FROM holdings WHERE name = a.name AND quantity != 0) AS positions,
+                (SELECT timestamp FROM transactions WHERE name = a.name ORDER BY id DESC LIMIT 1) AS last_trade_at
+            FROM accounts a WHERE a.name = ?
+        ) WHERE true
+        ON CONFLICT(name) DO UPDATE SET
+            portfolio_value=excluded.portfolio_value, profit_loss=excluded.profit_loss, balance=excluded.balance,
+            positions=excluded.positions, last_trade_at=excluded.last_trade_at, valued_at=excluded.valued_at,
+            version=excluded.version
+    ''', (name.lower(),))
+
+def _summarize_accounts(conn):
+    # One small row per account with the figures used to compare traders, so rankings and totals
+    # across every account are a query on this table rather than loading each account
+    conn.execute('''
+        CREATE TABLE account_summaries (
+            name TEXT PRIMARY KEY,
+            portfolio_value REAL,
+            profit_loss REAL,
+            balance REAL,
+            positions INTEGER NOT NULL,
+            last_trade_at TEXT,
+            valued_at TEXT,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX account_summaries_value ON account_summaries (portfolio_value)')
+    conn.execute('CREATE INDEX account_summaries_profit_loss ON account_summaries (profit_loss)')
+    conn.execute('CREATE INDEX account_summaries_positions ON account_summaries (positions)')
+    conn.execute('CREATE INDEX account_summaries_last_trade ON account_summaries (last_trade_at)')
+    for (name,) in conn.execute('SELECT name FROM accounts').fetchall():
+        _write_summary(conn, name)
+
+MIGRATIONS = [
+    _index_logs_by_name,
+    _normalize_accounts,
+    _index_portfolio_values_by_time,
+    _version_accounts,
+    _track_cost_basis,
+    _cache_prices,
+    _define_traders,
+    _record_span_latency,
+    _summarize_accounts,
+]
+
+def migrate():
+    with transaction(immediate=True) as conn:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+
+migrate()
+
+class VersionConflict(Exception):
+    """Raised when an account has been changed by someone else since the caller read it"""
+
+
+def _check_version(conn, name, expected_version: int | None):
+    if expected_version is None:
+        return
+    row = conn.execute('SELECT version FROM accounts WHERE name = ?', (name.lower(),)).fetchone()
+    if not row or row[0] != expected_version:
+        raise VersionConflict(f"Account {name} has changed since version {expected_version}")
+
+def _bump_version(conn, name) -> int:
+    conn.execute('UPDATE accounts SET version = version + 1 WHERE name = ?', (name.lower(),))
+    # Every write to an account ends here, so its summary row is kept current in the same transaction
+    _write_summary(conn, name)
+    return conn.execute('SELECT version FROM accounts WHERE name = ?', (name.lower(),)).fetchone()[0]
+
+def read_data_version() -> int:
+    """Changes whenever another connection commits to the database; cheap enough to check on every call"""
+    return get_connection().execute('PRAGMA data_version').fetchone()[0]
+
+def read_account_versions() -> dict[str, int]:
+    return dict(get_connection().execute('SELECT name, version FROM accounts').fetchall())
+
+def write_account(name, account_dict) -> int:
+    """Replace the whole account; used when creating or resetting it. Returns the new version."""
+    with transaction() as conn:
+        _replace_account(conn, name, account_dict)
+        _write_aggregates(conn, name, account_dict)
+        return _bump_version(conn, name)
 
 def read_account(name):
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT account FROM accounts WHERE name = ?', (name.lower(),))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
+    name = name.lower()
+    # One read transaction, so a trade committed part way through can't tear the account
+    with transaction() as conn:
+        row = conn.execute('''
+            SELECT balance, strategy, net_invested, realized_pnl, version FROM accounts WHERE name = ?
+        ''', (name,)).fetchone()
+        if not row:
+            return None
+        holdings = conn.execute('SELECT symbol, quantity, cost_basis FROM holdings WHERE name = ?', (name,)).fetchall()
+        transactions = conn.execute('''
+            SELECT symbol, quantity, price, timestamp, rationale FROM transactions
+            WHERE name = ?
+            ORDER BY id
+        ''', (name,)).fetchall()
+        values = conn.execute(
+            'SELECT datetime, value FROM portfolio_values WHERE name = ? ORDER BY id', (name,)
+        ).fetchall()
+    balance, strategy, net_invested, realized_pnl, version = row
+    return {
+        "name": name,
+        "balance": balance,
+        "strategy": strategy,
+        "holdings": {symbol: quantity for symbol, quantity, _ in holdings},
+        "transactions": [
+            {"symbol": symbol, "quantity": quantity, "price": price, "timestamp": timestamp, "rationale": rationale}
+            for symbol, quantity, price, timestamp, rationale in transactions
+        ],
+        "portfolio_value_time_series": values,
+        "net_invested": net_invested,
+        "realized_pnl": realized_pnl,
+        "cost_basis": {symbol: cost for symbol, _, cost in holdings},
+        "version": version,
+    }
+
+def write_account_fields(
+    name, balance: float | None = None, strategy: str | None = None, expected_version: int | None = None
+) -> int:
+    """
+    Update just the cash balance and/or strategy of an account. Returns the new version.
+    If expected_version is given, raises VersionConflict unless the account is still at that version.
+    """
+    with transaction(immediate=True) as conn:
+        _check_version(conn, name, expected_version)
+        if balance is not None:
+            conn.execute('UPDATE accounts SET balance = ? WHERE name = ?', (balance, name.lower()))
+        if strategy is not None:
+            conn.execute('UPDATE accounts SET strategy = ? WHERE name = ?', (strategy, name.lower()))
+        return _bump_version(conn, name)
+
+def write_trade(
+    name,
+    transaction_dict: dict,
+    holding: int,
+    cost_basis: float,
+    balance: float,
+    net_invested: float,
+    realized_pnl: float,
+    expected_version: int | None = None,
+) -> int:
+    """
+    Record a trade: append the transaction, set the new quantity and cost basis held of its symbol,
+    and the account's new cash balance and running totals, all in one transaction. Returns the new version.
+    This is a compare-and-swap: with expected_version, it raises VersionConflict and writes nothing
+    if another writer got in first. BEGIN IMMEDIATE makes the check and the writes atomic.
+    """
+    return write_trades(
+        name,
+        [transaction_dict],
+        {transaction_dict["symbol"]: (holding, cost_basis)},
+        balance,
+        net_invested,
+        realized_pnl,
+        expected_version,
+    )
+
+def write_trades(
+    name,
+    transaction_dicts: list[dict],
+    holdings: dict[str, tuple[int, float]],
+    balance: float,
+    net_invested: float,
+    realized_pnl: float,
+    expected_version: int | None = None,
+) -> int:
+    """
+    Record a batch of trades as one compare-and-swap, like write_trade: append the transactions,
+    set the (quantity, cost basis) now held of each symbol they touched, and the account's
+    new balance and running totals. Either every trade is recorded or none is.
+    """
+    name = name.lower()
+    with transaction(immediate=True) as conn:
+        _check_version(conn, name, expected_version)
+        conn.executemany('''
+            INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale)
+            VALUES (:name, :symbol, :quantity, :price, :timestamp, :rationale)
+        ''', [{"name": name, **transaction_dict} for transaction_dict in transaction_dicts])
+        conn.executemany('''
+            INSERT INTO holdings (name, symbol, quantity, cost_basis) VALUES (?, ?, ?, ?)
+            ON CONFLICT(name, symbol) DO UPDATE SET quantity=excluded.quantity, cost_basis=excluded.cost_basis
+        ''', [(name, symbol, holding, cost) for symbol, (holding, cost) in holdings.items() if holding])
+        conn.executemany(
+            'DELETE FROM holdings WHERE name = ? AND symbol = ?',
+            [(name, symbol) for symbol, (holding, _) in holdings.items() if not holding],
+        )
+        conn.execute(
+            'UPDATE accounts SET balance = ?, net_invested = ?, realized_pnl = ? WHERE name = ?',
+            (balance, net_invested, realized_pnl, name),
+        )
+        return _bump_version(conn, name)
+
+def write_portfolio_value(name, datetime: str, value: float) -> int:
+    with transaction() as conn:
+        conn.execute(
+            'INSERT INTO portfolio_values (name, datetime, value) VALUES (?, ?, ?)',
+            (name.lower(), datetime, value),
+        )
+        return _bump_version(conn, name)
+
+# Columns the leaderboard can be ranked by; each has its own index
+SUMMARY_ORDERS = ("portfolio_value", "profit_loss", "positions", "last_trade_at")
+SUMMARY_COLUMNS = ("name", "portfolio_value", "profit_loss", "balance", "positions", "last_trade_at", "valued_at", "version")
+
+def read_account_summary(name) -> dict | None:
+    row = get_connection().execute(
+        f'SELECT {", ".join(SUMMARY_COLUMNS)} FROM account_summaries WHERE name = ?', (name.lower(),)
+    ).fetchone()
+    return dict(zip(SUMMARY_COLUMNS, row)) if row else None
+
+def read_leaderboard(
+    order_by: str = "portfolio_value", limit: int = 10, ascending: bool = False, names: list[str] | None = None
+) -> list[dict]:
+    """
+    The top accounts by one of the SUMMARY_ORDERS columns, best first, each with its rank;
+    only among the named accounts if names is given. Without names it walks the column's index;
+    with them, it looks each one up by name and sorts just those rows.
+    """
+    if order_by not in SUMMARY_ORDERS:
+        raise ValueError(f"Can't rank accounts by {order_by}; choose one of {', '.join(SUMMARY_ORDERS)}")
+    among = f'AND name IN ({",".join("?" * len(names))})' if names is not None else ''
+    rows = get_connection().execute(f'''
+        SELECT {", ".join(SUMMARY_COLUMNS)} FROM account_summaries
+        WHERE {order_by} IS NOT NULL {among}
+        ORDER BY {order_by} {"ASC" if ascending else "DESC"}
+        LIMIT ?
+    ''', (*[name.lower() for name in names or []], limit))
+    return [{"rank": rank, **dict(zip(SUMMARY_COLUMNS, row))} for rank, row in enumerate(rows, start=1)]
+
+def read_summary_aggregates() -> dict:
+    """Totals and averages across every account, in a single pass over the summary table"""
+    row = get_connection().execute('''
+        SELECT COUNT(*), SUM(portfolio_value), AVG(portfolio_value), SUM(profit_loss), AVG(profit_loss),
+            MIN(profit_loss), MAX(profit_loss), SUM(profit_loss > 0), SUM(positions), SUM(balance), MAX(last_trade_at)
+        FROM account_summaries
+    ''').fetchone()
+    keys = (
+        "accounts", "total_value", "average_value", "total_profit_loss", "average_profit_loss",
+        "worst_profit_loss", "best_profit_loss", "profitable_accounts", "total_positions", "total_cash", "last_trade_at",
+    )
+    return dict(zip(keys, row))
+
+def read_portfolio_values(name, start: str | None = None, end: str | None = None, max_points: int | None = None):
+    """
+    Read the portfolio value time series for an account, optionally limited to a time range.
+    If there are more than max_points values in the range, they are downsampled in SQL into
+    equal time buckets, keeping the last value of each bucket.
+
+    Args:
+        name (str): The account name
+        start (str): Earliest datetime to include, as "YYYY-MM-DD HH:MM:SS"
+        end (str): Latest datetime to include, as "YYYY-MM-DD HH:MM:SS"
+        max_points (int): Maximum number of points to return
+
+    Returns:
+        list: A list of (datetime, value) tuples in time order
+    """
+    params = {"name": name.lower(), "start": start or "", "end": end or "9999"}
+    where = 'WHERE name = :name AND datetime >= :start AND datetime <= :end'
+    conn = get_connection()
+    count, first, last = conn.execute(
+        f'SELECT COUNT(*), MIN(datetime), MAX(datetime) FROM portfolio_values {where}', params
+    ).fetchone()
+    if not max_points or count <= max_points:
+        return conn.execute(
+            f'SELECT datetime, value FROM portfolio_values {where} ORDER BY datetime', params
+        ).fetchall()
+    span = conn.execute("SELECT strftime('%s', ?) - strftime('%s', ?)", (last, first)).fetchone()[0]
+    params["first"] = first
+    params["bucket"] = max(1, -(-(span + 1) // max_points))
+    # SQLite returns the bare value column from the row holding MAX(datetime) in each group
+    return conn.execute(f'''
+        SELECT MAX(datetime), value FROM portfolio_values {where}
+        GROUP BY (strftime('%s', datetime) - strftime('%s', :first)) / :bucket
+        ORDER BY 1
+    ''', params).fetchall()
     
+def _insert_logs(rows: list[tuple]) -> None:
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO logs (name, datetime, type, message)
+            VALUES (?, ?, ?, ?)
+        ''', rows)
+
+log_writer = LogWriter(_insert_logs).register_shutdown()
+
 def write_log(name: str, type: str, message: str):
     """
     Write a log entry to the logs table.
+    The entry is queued and written in a batch by a background thread; call flush_logs()
+    if you need it to be on disk before continuing.
     
     Args:
         name (str): The name associated with the log
         type (str): The type of log entry
         message (str): The log message
     """
-    now = datetime.now().isoformat()
-    
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO logs (name, datetime, type, message)
-            VALUES (?, datetime('now'), ?, ?)
-        ''', (name.lower(), type, message))
-        conn.commit()
+    log_writer.write(name, type, message)
+
+# Upper bounds, in seconds, of the span latency histogram buckets
+SPAN_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float("inf")]
+
+def _bucket(seconds: float) -> float:
+    return next(le for le in SPAN_BUCKETS if seconds <= le)
+
+def _record_span_timings(rows: list[tuple]) -> None:
+    """Fold a batch of (name, type, seconds) timings into the histograms, one upsert per bucket touched"""
+    buckets = {}
+    for name, type, seconds in rows:
+        key = (name, type, _bucket(seconds))
+        count, total, longest = buckets.get(key, (0, 0.0, 0.0))
+        buckets[key] = (count + 1, total + seconds, max(longest, seconds))
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO span_latency (name, type, le, count, total_seconds, max_seconds)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name, type, le) DO UPDATE SET
+                count = count + excluded.count,
+                total_seconds = total_seconds + excluded.total_seconds,
+                max_seconds = MAX(max_seconds, excluded.max_seconds)
+        ''', [(*key, *value) for key, value in buckets.items()])
+
+span_writer = LogWriter(_record_span_timings).register_shutdown()
+
+def write_span_timing(name: str, type: str, seconds: float) -> None:
+    """Queue one span's duration; like log entries, timings are written in batches by a background thread"""
+    span_writer.put((name.lower(), type, seconds))
+
+def read_span_latency(name: str | None = None) -> list[dict]:
+    """
+    Latency stats for each trader and span type: count, mean, max, and p50/p95 estimated
+    as the upper bound of the histogram bucket they fall in.
+    """
+    rows = get_connection().execute('''
+        SELECT name, type, le, count, total_seconds, max_seconds FROM span_latency
+        WHERE :name IS NULL OR name = :name
+        ORDER BY name, type, le
+    ''', {"name": name.lower() if name else None}).fetchall()
+    groups = {}
+    for row_name, type, le, count, total, longest in rows:
+        groups.setdefault((row_name, type), []).append((le, count, total, longest))
+    stats = []
+    for (row_name, type), buckets in groups.items():
+        count = sum(bucket[1] for bucket in buckets)
+        longest = max(bucket[3] for bucket in buckets)
+
+        def quantile(q):
+            seen = 0
+            for le, bucket_count, _, _ in buckets:
+                seen += bucket_count
+                if seen >= q * count:
+                    return min(le, longest)
+            return longest
+
+        stats.append({
+            "name": row_name,
+            "type": type,
+            "count": count,
+            "mean_seconds": sum(bucket[2] for bucket in buckets) / count,
+            "p50_seconds": quantile(0.5),
+            "p95_seconds": quantile(0.95),
+            "max_seconds": longest,
+        })
+    return stats
+
+def flush_logs(timeout: float | None = 5.0) -> bool:
+    """Block until every queued log entry and span timing has been written"""
+    return log_writer.flush(timeout) and span_writer.flush(timeout)
+
+def shutdown_logs() -> None:
+    """Write any queued log entries and span timings, and stop the background writers"""
+    log_writer.shutdown()
+    span_writer.shutdown()
 
 def read_log(name: str, last_n=10):
     """
@@ -71,31 +591,102 @@ def read_log(name: str, last_n=10):
     Returns:
         list: A list of tuples containing (datetime, type, message)
     """
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT datetime, type, message FROM logs 
-            WHERE name = ? 
-            ORDER BY datetime DESC
-            LIMIT ?
-        ''', (name.lower(), last_n))
-        
-        return reversed(cursor.fetchall())
+    conn = get_connection()
+    cursor = conn.execute('''
+        SELECT datetime, type, message FROM logs 
+        WHERE name = ? 
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), last_n))
+    return reversed(cursor.fetchall())
+
+def read_log_entries(name: str, last_n: int = 10, max_id: int | None = None) -> list[tuple]:
+    """The most recent (id, datetime, type, message) log entries for a name, oldest first, up to max_id if given"""
+    rows = get_connection().execute('''
+        SELECT id, datetime, type, message FROM logs
+        WHERE name = ? AND id <= ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), max_id if max_id is not None else 2**63 - 1, last_n)).fetchall()
+    return rows[::-1]
+
+def read_logs_since(last_id: int, limit: int = 1000) -> list[tuple]:
+    """Every (id, name, datetime, type, message) log entry written after last_id, oldest first"""
+    return get_connection().execute('''
+        SELECT id, name, datetime, type, message FROM logs
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (last_id, limit)).fetchall()
+
+def read_last_log_id() -> int:
+    return get_connection().execute('SELECT COALESCE(MAX(id), 0) FROM logs').fetchone()[0]
+
+def write_prices(prices: dict[str, float]) -> None:
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO prices (symbol, price, fetched_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(symbol) DO UPDATE SET price=excluded.price, fetched_at=excluded.fetched_at
+        ''', [(symbol, price, now) for symbol, price in prices.items()])
+
+def read_prices(symbols: list[str], max_age: float) -> dict[str, tuple[float, float]]:
+    """Return (price, fetched_at) for each of the symbols fetched within the last max_age seconds"""
+    placeholders = ",".join("?" * len(symbols))
+    rows = get_connection().execute(
+        f'SELECT symbol, price, fetched_at FROM prices WHERE symbol IN ({placeholders}) AND fetched_at >= ?',
+        (*symbols, time.time() - max_age),
+    )
+    return {symbol: (price, fetched_at) for symbol, price, fetched_at in rows}
 
 def write_market(date: str, data: dict) -> None:
     data_json = json.dumps(data)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with transaction() as conn:
+        conn.execute('''
             INSERT INTO market (date, data)
             VALUES (?, ?)
             ON CONFLICT(date) DO UPDATE SET data=excluded.data
         ''', (date, data_json))
-        conn.commit()
 
 def read_market(date: str) -> dict | None:
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT data FROM market WHERE date = ?', (date,))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
\ No newline at end of file
+    conn = get_connection()
+    row = conn.execute('SELECT data FROM market WHERE date = ?', (date,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def write_trader(name: str, lastname: str, model_name: str, short_model_name: str | None = None, enabled: bool = True) -> None:
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO traders (name, lastname, model_name, short_model_name, enabled)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET lastname=excluded.lastname, model_name=excluded.model_name,
+                short_model_name=excluded.short_model_name, enabled=excluded.enabled
+        ''', (name, lastname, model_name, short_model_name or model_name, int(enabled)))
+
+def read_traders(enabled_only: bool = True) -> list[dict]:
+    rows = get_connection().execute(
+        'SELECT name, lastname, model_name, short_model_name, enabled FROM traders'
+        + (' WHERE enabled' if enabled_only else '') + ' ORDER BY rowid'
+    )
+    return [
+        {"name": name, "lastname": lastname, "model_name": model_name, "short_model_name": short_model_name, "enabled": bool(enabled)}
+        for name, lastname, model_name, short_model_name, enabled in rows
+    ]
+
+def write_shard_metrics(datetime: str, host: str, metrics: list[dict]) -> None:
+    """Record how one cycle went on each shard: traders run, how many failed, and how long it took"""
+    with transaction() as conn:
+        conn.executemany(
+            'INSERT INTO shard_metrics (datetime, host, shard, traders, failures, seconds) VALUES (?, ?, ?, ?, ?, ?)',
+            [(datetime, host, m["shard"], m["traders"], m["failures"], m["seconds"]) for m in metrics],
+        )
+
+def read_shard_metrics(last_n: int = 50) -> list[dict]:
+    rows = get_connection().execute(
+        'SELECT datetime, host, shard, traders, failures, seconds FROM shard_metrics ORDER BY id DESC LIMIT ?',
+        (last_n,),
+    )
+    return [
+        {"datetime": dt, "host": host, "shard": shard, "traders": traders, "failures": failures, "seconds": seconds}
+        for dt, host, shard, traders, failures, seconds in rows
+    ]
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from database import read_data_version, read_last_log_id, read_log_entries, read_logs_since
+
+POLL_INTERVAL_SECONDS = 0.25
+KEEP_LAST = 13
+
+
+class LogFeed:
+    """
+    Follows the logs table from a single background thread, so waiters only ever check
+    in-memory versions. However many dashboards are open, the database sees one
+    PRAGMA data_version check per interval, and one query for the new rows when there are any.
+    Each name's recent entries are kept in memory and appended to as rows arrive.
+    """
+
+    def __init__(self, keep_last: int = KEEP_LAST, interval: float = POLL_INTERVAL_SECONDS):
+        self.keep_last = keep_last
+        self.interval = interval
+        self.last_id = 0
+        self.entries: dict[str, deque] = {}
+        self.versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self) -> "LogFeed":
+        with self._lock:
+            if self._thread is None:
+                self.last_id = read_last_log_id()
+                self._thread = threading.Thread(target=self._follow, name="log-feed", daemon=True)
+                self._thread.start()
+        return self
+
+    def _load(self, name: str) -> None:
+        # The first time a name is asked for, fill in its history up to where the feed has got to
+        if name not in self.entries:
+            self.entries[name] = deque(
+                (row[1:] for row in read_log_entries(name, self.keep_last, max_id=self.last_id)),
+                maxlen=self.keep_last,
+            )
+            self.versions[name] = 0
+
+    def _follow(self) -> None:
+        data_version = None
+        while True:
+            time.sleep(self.interval)
+            try:
+                current = read_data_version()
+                if current == data_version:
+                    continue
+                data_version = current
+                while rows := read_logs_since(self.last_id):
+                    with self._lock:
+                        for id, name, *entry in rows:
+                            if name in self.entries:
+                                self.entries[name].append(tuple(entry))
+                                self.versions[name] += 1
+                        self.last_id = rows[-1][0]
+            except Exception as e:
+                print(f"Log feed failed to read new entries: {e}")
+
+    def latest(self, name: str) -> tuple[int, list[tuple]]:
+        """The version and recent (datetime, type, message) entries for a name"""
+        name = name.lower()
+        self.start()
+        with self._lock:
+            self._load(name)
+            return self.versions[name], list(self.entries[name])
+
+    async def wait_async(self, name: str, seen_version: int, timeout: float) -> tuple[int, list[tuple]]:
+        """
+        Wait until a name has entries newer than seen_version, or the timeout passes; then return latest().
+        Checks the in-memory version once per interval rather than holding a thread, so any number
+        of waiters cost nothing but a timer each.
+        """
+        deadline = time.monotonic() + timeout
+        version, entries = self.latest(name)
+        while version == seen_version and time.monotonic() < deadline:
+            await asyncio.sleep(self.interval)
+            version, entries = self.latest(name)
+        return version, entries
+
+
+log_feed = LogFeed()
@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+import atexit
+from datetime import datetime, timezone
+from typing import Callable
+
+FLUSH_INTERVAL_MS = 200
+BATCH_SIZE = 500
+MAX_QUEUE = 10_000
+BACKPRESSURE_TIMEOUT = 0.05
+
+_STOP = object()
+
+
+class LogWriter:
+    """
+    Collects log rows in memory and writes them from a background thread.
+    Rows are coalesced until BATCH_SIZE rows are waiting or FLUSH_INTERVAL_MS has passed
+    since the first one arrived, then handed to the sink in one call (one transaction).
+    Callers only ever pay for a queue put, so the agent's event loop never waits on disk.
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[list[tuple]], None],
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+        batch_size: int = BATCH_SIZE,
+        max_queue: int = MAX_QUEUE,
+    ):
+        self.sink = sink
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if not self.running:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def write(self, name: str, type: str, message: str) -> None:
+        """
+        Queue a log row. The timestamp is taken now (in UTC, like SQLite's datetime('now')),
+        not when the batch is flushed. If the queue is full we wait briefly for the writer
+        to catch up, and drop the row rather than stall the caller any longer.
+        """
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self.put((name.lower(), now, type, message))
+
+    def put(self, row: tuple) -> None:
+        """Queue a row exactly as given, for sinks that take something other than log entries"""
+        if self._stopped:
+            self.sink([row])
+            return
+        self.start()
+        try:
+            self._queue.put(row, timeout=BACKPRESSURE_TIMEOUT)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(f"Log queue is full; dropped {self.dropped} rows so far")
+
+    def flush(self, timeout: float | None = 5.0) -> bool:
+        """Block until everything queued so far has been written; returns False on timeout"""
+        if not self.running:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def shutdown(self, timeout: float | None = 5.0) -> None:
+        """Write everything still queued and stop the background thread"""
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            rows, waiters, stop = [], [], False
+
+            def take(item):
+                nonlocal stop
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    rows.append(item)
+
+            take(self._queue.get())
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size and not (waiters or stop):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    take(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Whatever else is already waiting goes into the same batch
+            while len(rows) < self.batch_size:
+                try:
+                    take(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if rows:
+                try:
+                    self.sink(rows)
+                    self.written += len(rows)
+                    self.batches += 1
+                except Exception as e:
+                    print(f"Failed to write {len(rows)} log entries: {e}")
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def register_shutdown(self) -> "LogWriter":
+        atexit.register(self.shutdown)
+        return self
@@ -1,9 +1,11 @@
 from polygon import RESTClient
 from dotenv import load_dotenv
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import random
-from database import write_market, read_market
+from database import write_market, read_market, read_prices, write_prices
+from price_cache import PriceCache
+from bar_store import bar_store
 from functools import lru_cache
 from datetime import timezone
 
@@ -14,6 +16,28 @@ polygon_plan = os.getenv("POLYGON_PLAN")
 
 is_paid_polygon = polygon_plan == "paid"
 is_realtime_polygon = polygon_plan == "realtime"
+# Both paid plans price shares from live snapshots; the free plan uses the prior day's grouped closes
+has_snapshot_prices = is_paid_polygon or is_realtime_polygon
+
+# Snapshot prices are cached briefly: the same symbol is typically priced several times in one trader run,
+# for less time on the realtime plan, where prices are current. The optional shared tier lets the accounts and market servers reuse each other's lookups.
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", "5" if is_realtime_polygon else "60"))
+SHARED_PRICE_CACHE = os.getenv("SHARED_PRICE_CACHE", "true").strip().lower() == "true"
+
+price_cache = (
+    PriceCache(PRICE_CACHE_TTL, load=read_prices, save=write_prices)
+    if SHARED_PRICE_CACHE
+    else PriceCache(PRICE_CACHE_TTL)
+)
+
+# When set, every price lookup goes here instead of Polygon; used to replay the floor offline
+price_source = None
+
+
+def set_price_source(source) -> None:
+    """Install a replay price source (anything with get_share_prices(symbols)), or None for live prices"""
+    global price_source
+    price_source = source
 
 
 def is_market_open() -> bool:
@@ -30,9 +54,45 @@ def get_all_share_prices_polygon_eod() -> dict[str, float]:
     last_close = datetime.fromtimestamp(probe.timestamp / 1000, tz=timezone.utc).date()
 
     results = client.get_grouped_daily_aggs(last_close, adjusted=True, include_otc=False)
+    record_bars(last_close, results)
     return {result.ticker: result.close for result in results}
 
 
+def record_bars(day, results) -> None:
+    """Keep a day of grouped daily aggs in the local bar store for history, charts and backtests"""
+    try:
+        bar_store.add_day(day, {
+            result.ticker: {
+                "open": result.open,
+                "high": result.high,
+                "low": result.low,
+                "close": result.close,
+                "volume": result.volume,
+            }
+            for result in results
+        })
+    except Exception as e:
+        print(f"Was not able to record bars for {day} due to {e}")
+
+
+def backfill_bars(start: str, end: str) -> None:
+    """Fill the local bar store with grouped daily aggs for each weekday in a date range"""
+    client = RESTClient(polygon_api_key)
+    day = datetime.strptime(start, "%Y-%m-%d").date()
+    last = datetime.strptime(end, "%Y-%m-%d").date()
+    while day <= last:
+        if day.weekday() < 5 and not bar_store.has_day(day):
+            results = client.get_grouped_daily_aggs(day, adjusted=True, include_otc=False)
+            if results:
+                record_bars(day, results)
+        day += timedelta(days=1)
+
+
+def get_historical_share_price(symbol: str, day: str) -> float:
+    """The close for a symbol on a date (or the last trading day before it) from the local bar store"""
+    return bar_store.price(symbol, day) or 0.0
+
+
 @lru_cache(maxsize=2)
 def get_market_for_prior_date(today):
     market_data = read_market(today)
@@ -48,23 +108,68 @@ def get_share_price_polygon_eod(symbol) -> float:
     return market_data.get(symbol, 0.0)
 
 
-def get_share_price_polygon_min(symbol) -> float:
+def fetch_share_price_polygon_min(symbol) -> float:
     client = RESTClient(polygon_api_key)
     result = client.get_snapshot_ticker("stocks", symbol)
     return result.min.close or result.prev_day.close
 
 
+def get_share_price_polygon_min(symbol) -> float:
+    return price_cache.get(symbol, lambda symbols: {symbol: fetch_share_price_polygon_min(symbol)})
+
+
+def get_share_prices_polygon_eod(symbols: list[str]) -> dict[str, float]:
+    today = datetime.now().date().strftime("%Y-%m-%d")
+    market_data = get_market_for_prior_date(today)
+    return {symbol: market_data.get(symbol, 0.0) for symbol in symbols}
+
+
+def fetch_share_prices_polygon_min(symbols: list[str]) -> dict[str, float]:
+    client = RESTClient(polygon_api_key)
+    results = client.get_snapshot_all("stocks", tickers=list(symbols))
+    prices = {result.ticker: result.min.close or result.prev_day.close for result in results}
+    return {symbol: prices.get(symbol, 0.0) for symbol in symbols}
+
+
+def get_share_prices_polygon_min(symbols: list[str]) -> dict[str, float]:
+    return price_cache.get_many(symbols, fetch_share_prices_polygon_min)
+
+
 def get_share_price_polygon(symbol) -> float:
-    if is_paid_polygon:
+    if has_snapshot_prices:
         return get_share_price_polygon_min(symbol)
     else:
         return get_share_price_polygon_eod(symbol)
 
 
 def get_share_price(symbol) -> float:
+    if price_source:
+        return price_source.get_share_prices([symbol])[symbol]
     if polygon_api_key:
         try:
             return get_share_price_polygon(symbol)
         except Exception as e:
             print(f"Was not able to use the polygon API due to {e}; using a random number")
     return float(random.randint(1, 100))
+
+
+def get_share_prices_polygon(symbols: list[str]) -> dict[str, float]:
+    if has_snapshot_prices:
+        return get_share_prices_polygon_min(symbols)
+    else:
+        return get_share_prices_polygon_eod(symbols)
+
+
+def get_share_prices(symbols: list[str]) -> dict[str, float]:
+    """Look up many symbols in one pass: one snapshot request on paid plans, one grouped EOD dict otherwise"""
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    if price_source:
+        return price_source.get_share_prices(symbols)
+    if polygon_api_key:
+        try:
+            return get_share_prices_polygon(symbols)
+        except Exception as e:
+            print(f"Was not able to use the polygon API due to {e}; using random numbers")
+    return {symbol: float(random.randint(1, 100)) for symbol in symbols}
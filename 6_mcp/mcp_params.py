@@ -29,18 +29,32 @@ trader_mcp_server_params = [
 
 # The full set of MCP servers for the researcher: Fetch, Brave Search and Memory
 
+fetch_mcp = {"command": "uvx", "args": ["mcp-server-fetch"]}
+brave_mcp = {
+    "command": "npx",
+    "args": ["-y", "@modelcontextprotocol/server-brave-search"],
+    "env": brave_env,
+}
+
 
 def researcher_mcp_server_params(name: str):
     return [
-        {"command": "uvx", "args": ["mcp-server-fetch"]},
-        {
-            "command": "npx",
-            "args": ["-y", "@modelcontextprotocol/server-brave-search"],
-            "env": brave_env,
-        },
+        fetch_mcp,
+        brave_mcp,
         {
             "command": "npx",
             "args": ["-y", "mcp-memory-libsql"],
             "env": {"LIBSQL_URL": f"file:./memory/{name}.db"},
         },
     ]
+
+
+# The trading floor runs just one of each server and shares it between traders.
+# Memory comes from memory_server.py, which keeps every trader's knowledge graph in one database;
+# its tools take a tenant argument that the pool fills in with the trader's name on each call
+
+memory_mcp = {"command": "uv", "args": ["run", "memory_server.py"]}
+
+shared_researcher_mcp_server_params = [fetch_mcp, brave_mcp, memory_mcp]
+
+tenant_scoped_mcp_server_params = [memory_mcp]
@@ -0,0 +1,219 @@
+import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from agents.mcp import MCPServer, MCPServerStdio
+from mcp_params import trader_mcp_server_params, shared_researcher_mcp_server_params, tenant_scoped_mcp_server_params
+
+load_dotenv(override=True)
+
+CLIENT_SESSION_TIMEOUT_SECONDS = 120
+HEALTH_CHECK_EVERY_N_SECONDS = int(os.getenv("MCP_HEALTH_CHECK_EVERY_N_SECONDS", "60"))
+HEALTH_CHECK_TIMEOUT_SECONDS = 10
+
+
+def server_name(params: dict) -> str:
+    """A short readable name for a server, like 'accounts_server.py' or 'mcp-server-fetch'"""
+    return params["args"][-1] if params.get("args") else params["command"]
+
+
+class PooledServer:
+    """
+    One long-lived MCP server process.
+    The stdio client must be entered and exited from the same task, so each server lives in a
+    task of its own that connects, waits to be told to stop, then closes the connection.
+    """
+
+    def __init__(self, name: str, params: dict):
+        self.name = name
+        self.params = params
+        self.server: MCPServerStdio | None = None
+        self.leases = 0
+        self.restarts = 0
+        self._task: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+
+    async def _serve(self, server: MCPServerStdio, ready: asyncio.Future, stop: asyncio.Event) -> None:
+        try:
+            async with server:
+                ready.set_result(None)
+                await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"MCP server {self.name} exited: {e}")
+
+    async def start(self) -> None:
+        self.server = MCPServerStdio(
+            self.params,
+            name=self.name,
+            cache_tools_list=True,
+            client_session_timeout_seconds=CLIENT_SESSION_TIMEOUT_SECONDS,
+        )
+        ready = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._serve(self.server, ready, self._stop))
+        await ready
+
+    async def stop(self) -> None:
+        if self._task:
+            self._stop.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def restart(self) -> None:
+        await self.stop()
+        await self.start()
+        self.restarts += 1
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def healthy(self) -> bool:
+        if not self.running or not self.server.session:
+            return False
+        try:
+            await asyncio.wait_for(self.server.session.send_ping(), HEALTH_CHECK_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            return False
+
+
+class TenantScopedServer(MCPServer):
+    """
+    One trader's view of a shared server whose tools take a tenant argument.
+    The tenant is hidden from the tool schemas the model sees and filled in with the trader's
+    name on every call, so traders can't read or write each other's data.
+    """
+
+    def __init__(self, server: MCPServer, tenant: str):
+        super().__init__()
+        self.server = server
+        self.tenant = tenant
+
+    @property
+    def name(self) -> str:
+        return f"{self.server.name} ({self.tenant})"
+
+    async def connect(self):
+        pass  # The pool owns the shared server's connection
+
+    async def cleanup(self):
+        pass
+
+    async def list_tools(self, *args, **kwargs):
+        tools = []
+        for tool in await self.server.list_tools(*args, **kwargs):
+            schema = dict(tool.inputSchema)
+            schema["properties"] = {key: value for key, value in schema.get("properties", {}).items() if key != "tenant"}
+            schema["required"] = [key for key in schema.get("required", []) if key != "tenant"]
+            tools.append(tool.model_copy(update={"inputSchema": schema}))
+        return tools
+
+    async def call_tool(self, tool_name: str, arguments: dict | None, *args, **kwargs):
+        return await self.server.call_tool(tool_name, {**(arguments or {}), "tenant": self.tenant}, *args, **kwargs)
+
+    async def list_prompts(self, *args, **kwargs):
+        return await self.server.list_prompts(*args, **kwargs)
+
+    async def get_prompt(self, *args, **kwargs):
+        return await self.server.get_prompt(*args, **kwargs)
+
+
+class MCPServerPool:
+    """
+    Keeps one instance of each MCP server running for every trader to share, instead of
+    launching and tearing them down every time a trader runs. Servers are started on first
+    lease (or up front with start), pinged periodically and restarted if they die or stop answering.
+    Per-trader state is chosen per call: tenant-scoped servers are lent out wrapped in a
+    TenantScopedServer that passes the trader's name with each tool call.
+    """
+
+    def __init__(self, health_check_every_n_seconds: int = HEALTH_CHECK_EVERY_N_SECONDS):
+        self.health_check_every_n_seconds = health_check_every_n_seconds
+        self.servers: dict[str, PooledServer] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._health_task: asyncio.Task | None = None
+
+    async def _get(self, params: dict) -> PooledServer:
+        key = json.dumps(params, sort_keys=True)
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            pooled = self.servers.get(key)
+            if pooled is None:
+                pooled = PooledServer(server_name(params), params)
+                await pooled.start()
+                self.servers[key] = pooled
+            elif not pooled.running:
+                print(f"Restarting MCP server {pooled.name}")
+                await pooled.restart()
+        return pooled
+
+    async def _get_all(self, params_list: list[dict]) -> list[PooledServer]:
+        return list(await asyncio.gather(*[self._get(params) for params in params_list]))
+
+    @staticmethod
+    def _for_tenant(pooled: PooledServer, name: str) -> MCPServer:
+        return TenantScopedServer(pooled.server, name) if pooled.params in tenant_scoped_mcp_server_params else pooled.server
+
+    @asynccontextmanager
+    async def lease(self, name: str):
+        """Lend a trader its (trader_mcp_servers, researcher_mcp_servers), connected and ready to use"""
+        trader_servers = await self._get_all(trader_mcp_server_params)
+        researcher_servers = await self._get_all(shared_researcher_mcp_server_params)
+        leased = trader_servers + researcher_servers
+        for pooled in leased:
+            pooled.leases += 1
+        try:
+            yield (
+                [self._for_tenant(pooled, name) for pooled in trader_servers],
+                [self._for_tenant(pooled, name) for pooled in researcher_servers],
+            )
+        finally:
+            for pooled in leased:
+                pooled.leases -= 1
+
+    async def start(self) -> None:
+        """Start the servers up front, so the first run doesn't pay for the launches"""
+        all_params = trader_mcp_server_params + shared_researcher_mcp_server_params
+        results = await asyncio.gather(*[self._get(params) for params in all_params], return_exceptions=True)
+        for params, result in zip(all_params, results):
+            if isinstance(result, BaseException):
+                print(f"Failed to start MCP server {server_name(params)}: {result}")
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._check_health_forever())
+
+    async def check_health(self) -> None:
+        """Restart any server that has exited, or that isn't answering pings while nobody is using it"""
+        for key, pooled in list(self.servers.items()):
+            if pooled.running and (pooled.leases or await pooled.healthy()):
+                continue
+            async with self._locks[key]:
+                if self.servers.get(key) is not pooled or (pooled.running and await pooled.healthy()):
+                    continue  # Someone else got here first
+                print(f"Restarting unhealthy MCP server {pooled.name}")
+                try:
+                    await pooled.restart()
+                except Exception as e:
+                    print(f"Failed to restart MCP server {pooled.name}: {e}")
+
+    async def _check_health_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_every_n_seconds)
+            await self.check_health()
+
+    async def close(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        await asyncio.gather(*[pooled.stop() for pooled in self.servers.values()])
+        self.servers.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
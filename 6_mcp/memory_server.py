@@ -0,0 +1,269 @@
+import os
+import sqlite3
+from dotenv import load_dotenv
+from pydantic import BaseModel, Field
+from mcp.server.fastmcp import FastMCP
+from connections import get_connection, transaction
+
+load_dotenv(override=True)
+
+# One knowledge graph server shared by every trader: each trader's graph is kept apart by a tenant
+# key passed on every call, rather than by running a separate server per trader's database file
+
+MEMORY_DB = os.getenv("MEMORY_DB", "memory/memory.db")
+LEGACY_MEMORY_DB = "memory/{tenant}.db"
+
+mcp = FastMCP("memory_server")
+
+
+class Entity(BaseModel):
+    name: str = Field(description="The name of the entity")
+    entityType: str = Field(description="The type of the entity, like company, person or website")
+    observations: list[str] = Field(default=[], description="Facts about the entity")
+
+
+class Relation(BaseModel):
+    source: str = Field(alias="from", description="The name of the entity the relation starts from")
+    target: str = Field(alias="to", description="The name of the entity the relation points to")
+    relationType: str = Field(description="The type of the relation, in active voice")
+
+
+def _setup() -> None:
+    os.makedirs(os.path.dirname(MEMORY_DB) or ".", exist_ok=True)
+    with transaction(MEMORY_DB) as conn:
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS entities (
+                tenant TEXT, name TEXT, entity_type TEXT, PRIMARY KEY (tenant, name)
+            ) WITHOUT ROWID"""
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS observations (
+                id INTEGER PRIMARY KEY, tenant TEXT, entity_name TEXT, content TEXT
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS observations_entity ON observations (tenant, entity_name)")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS relations (
+                tenant TEXT, source TEXT, target TEXT, relation_type TEXT,
+                PRIMARY KEY (tenant, source, target, relation_type)
+            ) WITHOUT ROWID"""
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS imported_tenants (tenant TEXT PRIMARY KEY, legacy_mtime INTEGER)")
+
+
+_setup()
+
+
+# Each tenant's old per-trader database file, as of when it was last imported, by modification time
+_imported: dict[str, int | None] = {}
+
+
+def _legacy_mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _import_legacy(conn, tenant: str, path: str) -> None:
+    """Merge a tenant's old per-trader database into the shared one, skipping anything already here"""
+    try:
+        legacy = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        entities = legacy.execute("SELECT name, entity_type FROM entities").fetchall()
+        observations = legacy.execute("SELECT entity_name, content FROM observations").fetchall()
+        relations = legacy.execute("SELECT source, target, relation_type FROM relations").fetchall()
+        legacy.close()
+    except sqlite3.Error as e:
+        print(f"Could not import memory for {tenant} from {path}: {e}")
+        return
+    conn.executemany("INSERT OR IGNORE INTO entities VALUES (?, ?, ?)", [(tenant, *row) for row in entities])
+    conn.executemany(
+        """INSERT INTO observations (tenant, entity_name, content) SELECT ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM observations WHERE tenant = ? AND entity_name = ? AND content = ?)""",
+        [(tenant, *row, tenant, *row) for row in observations],
+    )
+    conn.executemany("INSERT OR IGNORE INTO relations VALUES (?, ?, ?, ?)", [(tenant, *row) for row in relations])
+
+
+def _ensure_imported(tenant: str) -> None:
+    """
+    Bring in a tenant's old per-trader database the first time we see the tenant, and again
+    whenever that file has changed since, as it does after a lab run without the shared server.
+    Imports merge, so an entity deleted here that is still in the old file comes back.
+    Usually this is one stat of the file; an import has its own short write transaction,
+    so the tools' reads never need the write lock.
+    """
+    path = LEGACY_MEMORY_DB.format(tenant=tenant)
+    mtime = _legacy_mtime(path)
+    if tenant in _imported and _imported[tenant] == mtime:
+        return
+    query = "SELECT legacy_mtime FROM imported_tenants WHERE tenant = ?"
+    if mtime is not None and get_connection(MEMORY_DB).execute(query, (tenant,)).fetchone() != (mtime,):
+        with transaction(MEMORY_DB, immediate=True) as conn:
+            if conn.execute(query, (tenant,)).fetchone() != (mtime,):
+                _import_legacy(conn, tenant, path)
+                conn.execute(
+                    """INSERT INTO imported_tenants (tenant, legacy_mtime) VALUES (?, ?)
+                    ON CONFLICT(tenant) DO UPDATE SET legacy_mtime = excluded.legacy_mtime""",
+                    (tenant, mtime),
+                )
+    _imported[tenant] = mtime
+
+
+def _graph(conn, tenant: str, names: list[str] | None = None) -> dict:
+    """The tenant's entities with their observations, and the relations between them; all of them if names is None"""
+    if names is None:
+        rows = conn.execute("SELECT name, entity_type FROM entities WHERE tenant = ? ORDER BY name", (tenant,)).fetchall()
+    else:
+        rows = [
+            row
+            for name in names
+            for row in conn.execute("SELECT name, entity_type FROM entities WHERE tenant = ? AND name = ?", (tenant, name))
+        ]
+    entities = {name: {"name": name, "entityType": entity_type, "observations": []} for name, entity_type in rows}
+    for name, content in conn.execute(
+        "SELECT entity_name, content FROM observations WHERE tenant = ? ORDER BY id", (tenant,)
+    ):
+        if name in entities:
+            entities[name]["observations"].append(content)
+    relations = [
+        {"from": source, "to": target, "relationType": relation_type}
+        for source, target, relation_type in conn.execute(
+            "SELECT source, target, relation_type FROM relations WHERE tenant = ?", (tenant,)
+        )
+        if source in entities or target in entities
+    ]
+    return {"entities": list(entities.values()), "relations": relations}
+
+
+@mcp.tool()
+async def create_entities(tenant: str, entities: list[Entity]) -> str:
+    """Create new entities in the knowledge graph, or add observations to ones that already exist.
+
+    Args:
+        tenant: Whose knowledge graph to use
+        entities: The entities to create
+    """
+    _ensure_imported(tenant)
+    with transaction(MEMORY_DB, immediate=True) as conn:
+        for entity in entities:
+            conn.execute(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?, ?)", (tenant, entity.name, entity.entityType)
+            )
+            conn.executemany(
+                "INSERT INTO observations (tenant, entity_name, content) VALUES (?, ?, ?)",
+                [(tenant, entity.name, observation) for observation in entity.observations],
+            )
+    return f"Created {len(entities)} entities"
+
+
+@mcp.tool()
+async def add_observations(tenant: str, entity_name: str, observations: list[str]) -> str:
+    """Add observations to an existing entity in the knowledge graph.
+
+    Args:
+        tenant: Whose knowledge graph to use
+        entity_name: The name of the entity
+        observations: The facts to add
+    """
+    _ensure_imported(tenant)
+    with transaction(MEMORY_DB, immediate=True) as conn:
+        if not conn.execute("SELECT 1 FROM entities WHERE tenant = ? AND name = ?", (tenant, entity_name)).fetchone():
+            raise ValueError(f"Entity not found: {entity_name}")
+        conn.executemany(
+            "INSERT INTO observations (tenant, entity_name, content) VALUES (?, ?, ?)",
+            [(tenant, entity_name, observation) for observation in observations],
+        )
+    return f"Added {len(observations)} observations to {entity_name}"
+
+
+@mcp.tool()
+async def create_relations(tenant: str, relations: list[Relation]) -> str:
+    """Create relations between entities in the knowledge graph.
+
+    Args:
+        tenant: Whose knowledge graph to use
+        relations: The relations to create
+    """
+    _ensure_imported(tenant)
+    with transaction(MEMORY_DB, immediate=True) as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO relations VALUES (?, ?, ?, ?)",
+            [(tenant, relation.source, relation.target, relation.relationType) for relation in relations],
+        )
+    return f"Created {len(relations)} relations"
+
+
+@mcp.tool()
+async def search_nodes(tenant: str, query: str) -> dict:
+    """Search the knowledge graph for entities whose name, type or observations match the query.
+
+    Args:
+        tenant: Whose knowledge graph to use
+        query: The text to search for
+    """
+    _ensure_imported(tenant)
+    # A deferred transaction only reads, so it never waits on writers for the write lock
+    with transaction(MEMORY_DB) as conn:
+        pattern = f"%{query}%"
+        names = [
+            name
+            for (name,) in conn.execute(
+                """SELECT name FROM entities WHERE tenant = ? AND (name LIKE ? OR entity_type LIKE ?)
+                UNION
+                SELECT entity_name FROM observations WHERE tenant = ? AND content LIKE ?""",
+                (tenant, pattern, pattern, tenant, pattern),
+            )
+        ]
+        return _graph(conn, tenant, names)
+
+
+@mcp.tool()
+async def read_graph(tenant: str) -> dict:
+    """Read the whole knowledge graph.
+
+    Args:
+        tenant: Whose knowledge graph to use
+    """
+    _ensure_imported(tenant)
+    with transaction(MEMORY_DB) as conn:
+        return _graph(conn, tenant)
+
+
+@mcp.tool()
+async def delete_entity(tenant: str, name: str) -> str:
+    """Delete an entity from the knowledge graph, with its observations and relations.
+
+    Args:
+        tenant: Whose knowledge graph to use
+        name: The name of the entity to delete
+    """
+    _ensure_imported(tenant)
+    with transaction(MEMORY_DB, immediate=True) as conn:
+        conn.execute("DELETE FROM entities WHERE tenant = ? AND name = ?", (tenant, name))
+        conn.execute("DELETE FROM observations WHERE tenant = ? AND entity_name = ?", (tenant, name))
+        conn.execute("DELETE FROM relations WHERE tenant = ? AND (source = ? OR target = ?)", (tenant, name, name))
+    return f"Deleted {name}"
+
+
+@mcp.tool()
+async def delete_relation(tenant: str, source: str, target: str, relation_type: str) -> str:
+    """Delete a relation from the knowledge graph.
+
+    Args:
+        tenant: Whose knowledge graph to use
+        source: The name of the entity the relation starts from
+        target: The name of the entity the relation points to
+        relation_type: The type of the relation
+    """
+    _ensure_imported(tenant)
+    with transaction(MEMORY_DB, immediate=True) as conn:
+        conn.execute(
+            "DELETE FROM relations WHERE tenant = ? AND source = ? AND target = ? AND relation_type = ?",
+            (tenant, source, target, relation_type),
+        )
+    return f"Deleted relation {source} {relation_type} {target}"
+
+
+if __name__ == "__main__":
+    mcp.run(transport="stdio")
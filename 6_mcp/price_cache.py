@@ -0,0 +1,100 @@
+import threading
+import time
+from typing import Callable
+
+Fetch = Callable[[list[str]], dict[str, float]]
+
+
+class PriceCache:
+    """
+    Time-limited cache of share prices with single-flight fetching: if several callers want the same
+    symbol at once, only one fetch goes out and the others wait for its result.
+    Optionally backed by a second tier (load/save functions over a shared table) so that separate
+    processes, like the accounts and market servers, can reuse each other's lookups. load returns
+    (price, fetched_at) pairs no older than the TTL, with fetched_at as a time.time() timestamp.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        load: Callable[[list[str], float], dict[str, tuple[float, float]]] | None = None,
+        save: Callable[[dict[str, float]], None] | None = None,
+    ):
+        self.ttl = ttl
+        self.load = load
+        self.save = save
+        self.hits = 0
+        self.misses = 0
+        self._prices: dict[str, tuple[float, float]] = {}
+        # Each symbol being fetched, with the event its fetch sets when done and the prices it got
+        self._in_flight: dict[str, tuple[threading.Event, dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, symbol: str, now: float) -> float | None:
+        entry = self._prices.get(symbol)
+        if entry and now - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def get_many(self, symbols: list[str], fetch: Fetch) -> dict[str, float]:
+        prices, waiting, mine = {}, {}, []
+        flight = (threading.Event(), {})
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                price = self._fresh(symbol, now)
+                if price is not None:
+                    prices[symbol] = price
+                elif symbol in self._in_flight:
+                    waiting[symbol] = self._in_flight[symbol]
+                else:
+                    self._in_flight[symbol] = flight
+                    mine.append(symbol)
+            self.hits += len(prices)
+            self.misses += len(mine)
+
+        if mine:
+            event, results = flight
+            try:
+                results.update(self._fetch(mine, fetch))
+                prices.update(results)
+            finally:
+                with self._lock:
+                    for symbol in mine:
+                        self._in_flight.pop(symbol)
+                event.set()
+
+        for symbol, (event, results) in waiting.items():
+            event.wait()
+            # Failed lookups are shared too, so one failing fetch isn't repeated by every waiter;
+            # only if the other fetch raised do we try again ourselves
+            prices[symbol] = results[symbol] if symbol in results else self.get_many([symbol], fetch)[symbol]
+        return prices
+
+    def get(self, symbol: str, fetch: Fetch) -> float:
+        return self.get_many([symbol], fetch)[symbol]
+
+    def _fetch(self, symbols: list[str], fetch: Fetch) -> dict[str, float]:
+        now, wall_now = time.monotonic(), time.time()
+        # Prices from the shared tier keep their original age, so they expire on schedule
+        entries = {
+            symbol: (price, now - (wall_now - fetched_at))
+            for symbol, (price, fetched_at) in (self.load(symbols, self.ttl) if self.load else {}).items()
+        }
+        missing = [symbol for symbol in symbols if symbol not in entries]
+        failed = {}
+        if missing:
+            fetched = fetch(missing)
+            # A zero or missing price means the lookup failed; return it, but don't keep it for the whole TTL
+            found = {symbol: price for symbol, price in fetched.items() if price}
+            failed = {symbol: price for symbol, price in fetched.items() if not price}
+            if self.save and found:
+                self.save(found)
+            entries.update({symbol: (price, time.monotonic()) for symbol, price in found.items()})
+        with self._lock:
+            self._prices.update(entries)
+        return {**{symbol: price for symbol, (price, _) in entries.items()}, **failed}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._prices.clear()
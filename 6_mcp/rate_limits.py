@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import random
+import asyncio
+from dotenv import load_dotenv
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from agents import Model, ModelResponse
+
+load_dotenv(override=True)
+
+# Limits for each model provider, overridable with env vars like DEEPSEEK_RPM=30
+# max_concurrent caps requests in flight; rpm and tpm are requests and tokens per minute
+
+DEFAULT_LIMITS = {
+    "openai": {"max_concurrent": 8, "rpm": 500, "tpm": 200_000},
+    "deepseek": {"max_concurrent": 4, "rpm": 60, "tpm": 100_000},
+    "grok": {"max_concurrent": 4, "rpm": 60, "tpm": 100_000},
+    "gemini": {"max_concurrent": 4, "rpm": 60, "tpm": 100_000},
+    "openrouter": {"max_concurrent": 4, "rpm": 60, "tpm": 100_000},
+}
+
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+CHARS_PER_TOKEN = 4
+ESTIMATED_OUTPUT_TOKENS = 1_000
+
+RETRYABLE = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+class TokenBucket:
+    """Allows up to per_minute units a minute, refilling continuously; callers wait for enough to be available"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> None:
+        amount = min(amount, self.capacity)
+        # Holding the lock while we wait keeps callers first come, first served
+        async with self._lock:
+            self._refill()
+            while self.level < amount:
+                await asyncio.sleep((amount - self.level) / self.rate)
+                self._refill()
+            self.level -= amount
+
+    def adjust(self, amount: float) -> None:
+        """Correct an earlier estimate once the real usage is known; the level may go negative"""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+class ProviderLimiter:
+    """Caps in-flight requests and paces requests and tokens for one provider, retrying transient failures"""
+
+    def __init__(self, provider: str):
+        limits = {
+            key: int(os.getenv(f"{provider.upper()}_{key.upper()}", default))
+            for key, default in DEFAULT_LIMITS[provider].items()
+        }
+        self.provider = provider
+        self.semaphore = asyncio.Semaphore(limits["max_concurrent"])
+        self.requests = TokenBucket(limits["rpm"])
+        self.tokens = TokenBucket(limits["tpm"])
+
+    async def run(self, call, estimated_tokens: int):
+        for attempt in range(MAX_RETRIES + 1):
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimated_tokens)
+            try:
+                async with self.semaphore:
+                    response = await call()
+            except RETRYABLE as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                # Full jitter, so that requests that failed together don't all come back together
+                delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt))
+                print(f"{self.provider} request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            usage = getattr(response, "usage", None)
+            if usage and usage.total_tokens:
+                self.tokens.adjust(usage.total_tokens - estimated_tokens)
+            return response
+
+
+_limiters: dict[str, ProviderLimiter] = {}
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    if provider not in _limiters:
+        _limiters[provider] = ProviderLimiter(provider)
+    return _limiters[provider]
+
+
+def estimate_tokens(system_instructions: str | None, input) -> int:
+    text = (system_instructions or "") + (input if isinstance(input, str) else json.dumps(input, default=str))
+    return len(text) // CHARS_PER_TOKEN + ESTIMATED_OUTPUT_TOKENS
+
+
+class ThrottledModel(Model):
+    """Wraps a model so that every request to it goes through its provider's limiter"""
+
+    def __init__(self, model: Model, provider: str):
+        self.model = model
+        self.limiter = get_limiter(provider)
+
+    async def get_response(self, system_instructions, input, *args, **kwargs) -> ModelResponse:
+        return await self.limiter.run(
+            lambda: self.model.get_response(system_instructions, input, *args, **kwargs),
+            estimate_tokens(system_instructions, input),
+        )
+
+    async def stream_response(self, system_instructions, input, *args, **kwargs):
+        # Streams are paced and counted against the concurrency cap, but not retried part way through
+        limiter = self.limiter
+        await limiter.requests.acquire(1)
+        await limiter.tokens.acquire(estimate_tokens(system_instructions, input))
+        async with limiter.semaphore:
+            async for event in self.model.stream_response(system_instructions, input, *args, **kwargs):
+                yield event
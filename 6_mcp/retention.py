@@ -0,0 +1,122 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from connections import get_connection, transaction
+from database import DB
+
+load_dotenv(override=True)
+
+ARCHIVE_DB = os.getenv("LOG_ARCHIVE_DB", "logs_archive.db")
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "7"))
+LOG_KEEP_LAST_PER_NAME = int(os.getenv("LOG_KEEP_LAST_PER_NAME", "200"))
+COMPACT_EVERY_N_MINUTES = int(os.getenv("COMPACT_EVERY_N_MINUTES", "60"))
+
+
+def _db_size(conn) -> int:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    return page_size * page_count
+
+
+def _archive_floors(conn, cutoff: str, keep_last: int) -> dict[str, int]:
+    """For each name, the id below which rows can be archived: older than the cutoff and not in its last keep_last rows"""
+    floors = {}
+    for (name,) in conn.execute("SELECT DISTINCT name FROM logs").fetchall():
+        row = conn.execute(
+            "SELECT id FROM logs WHERE name = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (name, keep_last - 1),
+        ).fetchone()
+        if not row:
+            continue
+        keep_from = row[0]
+        newer = conn.execute(
+            "SELECT MIN(id) FROM logs WHERE name = ? AND datetime >= ?", (name, cutoff)
+        ).fetchone()[0]
+        floors[name] = min(keep_from, newer) if newer is not None else keep_from
+    return floors
+
+
+def compact_logs(
+    retention_days: int = LOG_RETENTION_DAYS,
+    keep_last: int = LOG_KEEP_LAST_PER_NAME,
+    archive_db: str = ARCHIVE_DB,
+) -> dict:
+    """
+    Move log rows older than retention_days into the archive database, always keeping each
+    trader's most recent keep_last rows for the dashboard, then give the freed pages back to the OS.
+    Returns stats on what was trimmed and how much space was reclaimed.
+    """
+    conn = get_connection()
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    size_before = _db_size(conn)
+    archived = 0
+
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_db,))
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS archive.logs (
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                datetime DATETIME,
+                type TEXT,
+                message TEXT
+            )
+        """)
+        with transaction(immediate=True):
+            for name, floor in _archive_floors(conn, cutoff, keep_last).items():
+                conn.execute("""
+                    INSERT OR IGNORE INTO archive.logs (id, name, datetime, type, message)
+                    SELECT id, name, datetime, type, message FROM main.logs
+                    WHERE name = ? AND id < ?
+                """, (name, floor))
+                archived += conn.execute(
+                    "DELETE FROM main.logs WHERE name = ? AND id < ?", (name, floor)
+                ).rowcount
+    finally:
+        conn.execute("DETACH DATABASE archive")
+
+    freelist_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0:
+        # The first compaction switches the file to incremental auto-vacuum, which needs a full VACUUM;
+        # after that, freed pages are returned cheaply without rewriting the database
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        # executescript steps the pragma to completion; execute() would only free a single page
+        conn.executescript("PRAGMA incremental_vacuum")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size_after = _db_size(conn)
+
+    stats = {
+        "archived_rows": archived,
+        "remaining_rows": conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0],
+        "freed_pages": freelist_before,
+        "size_before": size_before,
+        "size_after": size_after,
+        "reclaimed_bytes": size_before - size_after,
+    }
+    print(
+        f"Compacted logs: archived {archived} rows to {archive_db}, "
+        f"{stats['remaining_rows']} remain; {DB} {size_before:,} -> {size_after:,} bytes"
+    )
+    return stats
+
+
+def start_log_retention(every_n_minutes: int = COMPACT_EVERY_N_MINUTES) -> threading.Event:
+    """Run compact_logs in a background thread every N minutes; set the returned event to stop it"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(every_n_minutes * 60):
+            try:
+                compact_logs()
+            except Exception as e:
+                print(f"Log compaction failed: {e}")
+
+    threading.Thread(target=run, name="log-retention", daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
+    compact_logs()
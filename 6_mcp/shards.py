@@ -0,0 +1,150 @@
+"""
+Sharding of the trading floor across worker processes on one host.
+
+Sharding is per host only: every trader's account lives in the one SQLite accounts database,
+which can't be shared between hosts (WAL mode doesn't work over network filesystems).
+"""
+import os
+import time
+import zlib
+import queue
+import socket
+import asyncio
+import multiprocessing as mp
+from typing import List
+from dotenv import load_dotenv
+from agents import add_trace_processor
+from traders import Trader
+from tracers import LogTracer
+from mcp_pool import MCPServerPool
+from accounts_client import accounts_session
+
+load_dotenv(override=True)
+
+MAX_CONCURRENT_TRADERS = int(os.getenv("MAX_CONCURRENT_TRADERS", "4"))
+
+# HOST just labels this host's shard metrics
+HOST = os.getenv("FLOOR_HOST", socket.gethostname())
+
+
+def shard_of(name: str, shards: int) -> int:
+    """A trader's shard; stable across cycles and restarts, so a trader stays on the same worker"""
+    return zlib.crc32(name.encode()) % shards
+
+
+def assign(definitions: list[dict], workers: int) -> list[list[dict]]:
+    """Split the trader definitions between the workers"""
+    shards = [[] for _ in range(workers)]
+    for definition in definitions:
+        shards[shard_of(definition["name"], workers)].append(definition)
+    return shards
+
+
+async def run_traders(traders: List[Trader]) -> int:
+    """Run the traders, at most MAX_CONCURRENT_TRADERS at a time; returns how many failed"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRADERS)
+
+    async def run(trader: Trader) -> bool:
+        async with semaphore:
+            return await trader.run()
+
+    results = await asyncio.gather(*[run(trader) for trader in traders])
+    return results.count(False)
+
+
+class Shard:
+    """The traders one worker runs, kept between cycles so each keeps its place in the trade/rebalance rotation"""
+
+    def __init__(self, number: int, pool: MCPServerPool):
+        self.number = number
+        self.pool = pool
+        self.traders: dict[str, Trader] = {}
+
+    def _trader(self, definition: dict) -> Trader:
+        trader = self.traders.get(definition["name"])
+        if trader is None or trader.model_name != definition["model_name"]:
+            trader = Trader(definition["name"], definition["lastname"], definition["model_name"], pool=self.pool)
+            self.traders[definition["name"]] = trader
+        return trader
+
+    async def run(self, definitions: list[dict]) -> dict:
+        start = time.perf_counter()
+        failures = await run_traders([self._trader(definition) for definition in definitions])
+        return {
+            "shard": self.number,
+            "traders": len(definitions),
+            "failures": failures,
+            "seconds": time.perf_counter() - start,
+        }
+
+
+async def _worker_loop(number: int, tasks: mp.Queue, results: mp.Queue) -> None:
+    add_trace_processor(LogTracer())
+    async with MCPServerPool() as pool, accounts_session():
+        await pool.start()
+        shard = Shard(number, pool)
+        while (task := await asyncio.to_thread(tasks.get)) is not None:
+            cycle, definitions = task
+            results.put({"cycle": cycle, **await shard.run(definitions)})
+
+
+def _worker_main(number: int, tasks: mp.Queue, results: mp.Queue) -> None:
+    asyncio.run(_worker_loop(number, tasks, results))
+
+
+class WorkerPool:
+    """
+    Worker processes that each own an MCP server pool and run one shard of the traders.
+    The coordinator hands every worker its traders at the start of each cycle and collects
+    a metrics row per shard when they finish.
+    """
+
+    def __init__(self, workers: int):
+        self.context = mp.get_context("spawn")
+        self.results = self.context.Queue()
+        self.tasks = [self.context.Queue() for _ in range(workers)]
+        self.processes = [self._spawn(number) for number in range(workers)]
+        self.cycle = 0
+
+    def _spawn(self, number: int):
+        process = self.context.Process(
+            target=_worker_main, args=(number, self.tasks[number], self.results), name=f"shard-{number}", daemon=True
+        )
+        process.start()
+        return process
+
+    def _revive(self) -> None:
+        for number, process in enumerate(self.processes):
+            if not process.is_alive():
+                print(f"Worker for shard {number} exited with code {process.exitcode}, restarting it")
+                # Its queue may hold work it never picked up
+                self.tasks[number] = self.context.Queue()
+                self.processes[number] = self._spawn(number)
+
+    async def run_cycle(self, definitions: list[dict], timeout: float) -> list[dict]:
+        self._revive()
+        self.cycle += 1
+        shards = assign(definitions, len(self.processes))
+        for number, shard in enumerate(shards):
+            self.tasks[number].put((self.cycle, shard))
+        metrics = []
+        deadline = time.monotonic() + timeout
+        while len(metrics) < len(shards):
+            try:
+                result = await asyncio.to_thread(self.results.get, timeout=max(0.0, deadline - time.monotonic()))
+                # Ignore shards that report back late from an earlier cycle
+                if result.pop("cycle") == self.cycle:
+                    metrics.append(result)
+            except queue.Empty:
+                missing = set(range(len(shards))) - {m["shard"] for m in metrics}
+                print(f"Shards {sorted(missing)} didn't finish within {timeout:.0f}s")
+                break
+        return sorted(metrics, key=lambda m: m["shard"])
+
+    def close(self) -> None:
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,43 @@
+import threading
+from typing import Any, Callable, Hashable
+
+
+class SnapshotCache:
+    """
+    Builds each key's snapshot once per stamp and serves that same snapshot to every caller
+    until the stamp changes. Callers that arrive while a build is under way wait for it
+    rather than starting their own, so the cost of a view doesn't grow with its viewers.
+    """
+
+    def __init__(self):
+        self._entries: dict[Hashable, tuple[Hashable, Any]] = {}
+        self._locks: dict[Hashable, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+
+    def _current(self, key: Hashable, stamp: Hashable):
+        entry = self._entries.get(key)
+        return entry[1] if entry and entry[0] == stamp else None
+
+    def get(self, key: Hashable, stamp: Hashable, build: Callable[[], Any]) -> Any:
+        snapshot = self._current(key, stamp)
+        if snapshot is None:
+            with self._guard:
+                lock = self._locks.setdefault(key, threading.Lock())
+            with lock:
+                snapshot = self._current(key, stamp)
+                if snapshot is None:
+                    snapshot = build()
+                    self._entries[key] = (stamp, snapshot)
+                    self.builds += 1
+                    return snapshot
+        self.hits += 1
+        return snapshot
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        with self._guard:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
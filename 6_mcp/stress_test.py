@@ -0,0 +1,134 @@
+"""
+Stress test for concurrent trading: fires thousands of buys and sells, with some deposits and
+withdrawals mixed in, at a handful of accounts from many threads across several processes,
+then checks that no update was lost.
+
+Run with: uv run stress_test.py [processes] [threads] [trades_per_thread]
+"""
+
+import os
+import sys
+import random
+import tempfile
+import threading
+import time
+import multiprocessing as mp
+from collections import Counter
+
+NAMES = ["alice", "bob", "carol"]
+PRICES = {"AAPL": 200.0, "MSFT": 400.0, "NVDA": 100.0, "SPY": 500.0}
+
+
+def worker(trades_per_thread: int, threads: int, seed: int) -> Counter:
+    # Imported here so each process picks up ACCOUNTS_DB and opens its own connections
+    import accounts
+
+    accounts.get_share_price = PRICES.get
+    accounts.get_share_prices = lambda symbols: {symbol: PRICES[symbol] for symbol in symbols}
+    counts = Counter()
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        local = {name: accounts.Account.get(name) for name in NAMES}
+        for _ in range(trades_per_thread):
+            name = rng.choice(NAMES)
+            account = local[name]
+            symbol = rng.choice(list(PRICES))
+            if rng.random() < 0.1:
+                # Cash moves race against the trades, so a lost balance update shows up in the check
+                amount = rng.randint(1, 50)
+                try:
+                    if rng.random() < 0.5:
+                        account.deposit(amount)
+                    else:
+                        account.withdraw(amount)
+                        amount = -amount
+                except ValueError:
+                    amount = 0
+                with lock:
+                    counts[f"cash:{name}"] += amount
+                continue
+            try:
+                if rng.random() < 0.6:
+                    account.buy_shares(symbol, rng.randint(1, 3), "stress")
+                else:
+                    account.sell_shares(symbol, rng.randint(1, 3), "stress")
+                outcome = "completed"
+            except ValueError:
+                outcome = "rejected"
+            with lock:
+                counts[outcome] += 1
+
+    pool = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return counts
+
+
+def check(completed: int, cash: Counter) -> list[str]:
+    from database import read_account
+    from accounts import INITIAL_BALANCE
+
+    problems = []
+    total = 0
+    for name in NAMES:
+        account = read_account(name)
+        transactions = account["transactions"]
+        total += len(transactions)
+        held = Counter()
+        for transaction in transactions:
+            held[transaction["symbol"]] += transaction["quantity"]
+        if {symbol: quantity for symbol, quantity in held.items() if quantity} != account["holdings"]:
+            problems.append(f"{name}: holdings {account['holdings']} don't match transactions {dict(held)}")
+        if any(quantity < 0 for quantity in account["holdings"].values()):
+            problems.append(f"{name}: negative holdings {account['holdings']}")
+        net_invested = sum(t["quantity"] * t["price"] for t in transactions)
+        expected_balance = INITIAL_BALANCE + cash[f"cash:{name}"] - net_invested
+        if abs(expected_balance - account["balance"]) > 1e-6:
+            problems.append(f"{name}: balance {account['balance']} doesn't match {expected_balance}")
+        if abs(net_invested - account["net_invested"]) > 1e-6:
+            problems.append(f"{name}: net_invested {account['net_invested']} doesn't match {net_invested}")
+    if total != completed:
+        problems.append(f"{completed} trades completed but {total} transactions were recorded")
+    return problems
+
+
+def main(processes: int = 4, threads: int = 8, trades_per_thread: int = 100):
+    os.environ["ACCOUNTS_DB"] = os.path.join(tempfile.mkdtemp(), "stress.db")
+    from database import write_account
+    from accounts import INITIAL_BALANCE
+
+    for name in NAMES:
+        write_account(name, {
+            "balance": INITIAL_BALANCE,
+            "strategy": "",
+            "holdings": {},
+            "transactions": [],
+            "portfolio_value_time_series": [],
+        })
+
+    start = time.perf_counter()
+    with mp.get_context("spawn").Pool(processes) as pool:
+        results = pool.starmap(worker, [(trades_per_thread, threads, seed) for seed in range(processes)])
+    elapsed = time.perf_counter() - start
+
+    counts = Counter()
+    for result in results:
+        counts.update(result)
+    attempted = processes * threads * trades_per_thread
+    outcomes = {key: value for key, value in counts.items() if not key.startswith("cash:")}
+    print(f"{attempted} operations in {elapsed:.1f}s ({attempted / elapsed:.0f}/s): {outcomes}")
+    problems = check(counts["completed"], counts)
+    for problem in problems:
+        print(f"FAILED: {problem}")
+    if not problems:
+        print("OK: every completed trade was recorded and all accounts are consistent")
+    return not problems
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    sys.exit(0 if main(*args) else 1)
@@ -1,7 +1,8 @@
 from agents import TracingProcessor, Trace, Span
-from database import write_log
+from database import write_log, write_span_timing, flush_logs, shutdown_logs
 import secrets
 import string
+import time
 
 ALPHANUM = string.ascii_lowercase + string.digits 
 
@@ -16,6 +17,18 @@ def make_trace_id(tag: str) -> str:
     return f"trace_{tag}{random_suffix}"
 
 class LogTracer(TracingProcessor):
+    """
+    Logs each trace and span as it starts and ends, and records how long each took in the
+    span latency histograms. Both go through background writers, so the callbacks, which run
+    on the agent's event loop, never wait on the database.
+    """
+
+    def __init__(self):
+        self.started: dict[str, float] = {}
+
+    def elapsed(self, id: str) -> float | None:
+        start = self.started.pop(id, None)
+        return time.monotonic() - start if start is not None else None
 
     def get_name(self, trace_or_span: Trace | Span) -> str | None:
         trace_id = trace_or_span.trace_id
@@ -28,17 +41,24 @@ class LogTracer(TracingProcessor):
     def on_trace_start(self, trace) -> None:
         name = self.get_name(trace)
         if name:
+            self.started[trace.trace_id] = time.monotonic()
             write_log(name, "trace", f"Started: {trace.name}")
 
     def on_trace_end(self, trace) -> None:
         name = self.get_name(trace)
         if name:
-            write_log(name, "trace", f"Ended: {trace.name}")
+            message = f"Ended: {trace.name}"
+            seconds = self.elapsed(trace.trace_id)
+            if seconds is not None:
+                message += f" ({seconds:.1f}s)"
+                write_span_timing(name, "trace", seconds)
+            write_log(name, "trace", message)
 
     def on_span_start(self, span) -> None:
         name = self.get_name(span)
         type = span.span_data.type if span.span_data else "span"
         if name:
+            self.started[span.span_id] = time.monotonic()
             message = "Started"
             if span.span_data:
                 if span.span_data.type:
@@ -64,12 +84,16 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.name}"
                 if hasattr(span.span_data, "server") and span.span_data.server:
                     message += f" {span.span_data.server}"
+            seconds = self.elapsed(span.span_id)
+            if seconds is not None:
+                message += f" ({seconds:.2f}s)"
+                write_span_timing(name, type, seconds)
             if span.error:
                 message += f" {span.error}"
             write_log(name, type, message)
 
     def force_flush(self) -> None:
-        pass
+        flush_logs()
 
     def shutdown(self) -> None:
-        pass
\ No newline at end of file
+        shutdown_logs()
\ No newline at end of file
@@ -1,11 +1,12 @@
 from contextlib import AsyncExitStack
-from accounts_client import read_accounts_resource, read_strategy_resource
+from accounts_client import read_context_resource, read_strategy_resource
 from tracers import make_trace_id
-from agents import Agent, Tool, Runner, OpenAIChatCompletionsModel, trace
+from agents import Agent, Tool, Runner, OpenAIChatCompletionsModel, OpenAIResponsesModel, trace
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import os
-import json
+import asyncio
+from functools import lru_cache
 from agents.mcp import MCPServerStdio
 from templates import (
     researcher_instructions,
@@ -14,6 +15,7 @@ from templates import (
     rebalance_message,
     research_tool,
 )
+from rate_limits import ThrottledModel
 from mcp_params import trader_mcp_server_params, researcher_mcp_server_params
 
 load_dotenv(override=True)
@@ -30,23 +32,32 @@ OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
 MAX_TURNS = 30
 
-openrouter_client = AsyncOpenAI(base_url=OPENROUTER_BASE_URL, api_key=openrouter_api_key)
-deepseek_client = AsyncOpenAI(base_url=DEEPSEEK_BASE_URL, api_key=deepseek_api_key)
-grok_client = AsyncOpenAI(base_url=GROK_BASE_URL, api_key=grok_api_key)
-gemini_client = AsyncOpenAI(base_url=GEMINI_BASE_URL, api_key=google_api_key)
+# Clients are created on first use, so that a run which never calls a provider doesn't need its key.
+# They don't retry by themselves: retries, with jittered backoff, happen in each provider's limiter
+
+
+@lru_cache(maxsize=None)
+def get_client(base_url: str | None, api_key: str | None) -> AsyncOpenAI:
+    return AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0)
 
 
 def get_model(model_name: str):
+    """The model to use for model_name, throttled by its provider's concurrency and rate limits"""
     if "/" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=openrouter_client)
+        model = OpenAIChatCompletionsModel(model=model_name, openai_client=get_client(OPENROUTER_BASE_URL, openrouter_api_key))
+        return ThrottledModel(model, "openrouter")
     elif "deepseek" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=deepseek_client)
+        model = OpenAIChatCompletionsModel(model=model_name, openai_client=get_client(DEEPSEEK_BASE_URL, deepseek_api_key))
+        return ThrottledModel(model, "deepseek")
     elif "grok" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=grok_client)
+        model = OpenAIChatCompletionsModel(model=model_name, openai_client=get_client(GROK_BASE_URL, grok_api_key))
+        return ThrottledModel(model, "grok")
     elif "gemini" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=gemini_client)
+        model = OpenAIChatCompletionsModel(model=model_name, openai_client=get_client(GEMINI_BASE_URL, google_api_key))
+        return ThrottledModel(model, "gemini")
     else:
-        return model_name
+        model = OpenAIResponsesModel(model=model_name, openai_client=get_client(None, None))
+        return ThrottledModel(model, "openai")
 
 
 async def get_researcher(mcp_servers, model_name) -> Agent:
@@ -65,12 +76,13 @@ async def get_researcher_tool(mcp_servers, model_name) -> Tool:
 
 
 class Trader:
-    def __init__(self, name: str, lastname="Trader", model_name="gpt-4o-mini"):
+    def __init__(self, name: str, lastname="Trader", model_name="gpt-4o-mini", pool=None):
         self.name = name
         self.lastname = lastname
         self.agent = None
         self.model_name = model_name
         self.do_trade = True
+        self.pool = pool
 
     async def create_agent(self, trader_mcp_servers, researcher_mcp_servers) -> Agent:
         tool = await get_researcher_tool(researcher_mcp_servers, self.model_name)
@@ -84,15 +96,15 @@ class Trader:
         return self.agent
 
     async def get_account_report(self) -> str:
-        account = await read_accounts_resource(self.name)
-        account_json = json.loads(account)
-        account_json.pop("portfolio_value_time_series", None)
-        return json.dumps(account_json)
+        # A bounded summary rather than the full account, so the prompt doesn't grow with the account's history
+        return await read_context_resource(self.name)
+
+    async def get_strategy(self) -> str:
+        return await read_strategy_resource(self.name)
 
     async def run_agent(self, trader_mcp_servers, researcher_mcp_servers):
         self.agent = await self.create_agent(trader_mcp_servers, researcher_mcp_servers)
-        account = await self.get_account_report()
-        strategy = await read_strategy_resource(self.name)
+        account, strategy = await asyncio.gather(self.get_account_report(), self.get_strategy())
         message = (
             trade_message(self.name, strategy, account)
             if self.do_trade
@@ -101,6 +113,11 @@ class Trader:
         await Runner.run(self.agent, message, max_turns=MAX_TURNS)
 
     async def run_with_mcp_servers(self):
+        if self.pool:
+            async with self.pool.lease(self.name) as (trader_mcp_servers, researcher_mcp_servers):
+                await self.run_agent(trader_mcp_servers, researcher_mcp_servers)
+            return
+        # Without a pool, launch a fresh set of servers just for this run
         async with AsyncExitStack() as stack:
             trader_mcp_servers = [
                 await stack.enter_async_context(
@@ -123,9 +140,13 @@ class Trader:
         with trace(trace_name, trace_id=trace_id):
             await self.run_with_mcp_servers()
 
-    async def run(self):
+    async def run(self) -> bool:
+        """Run the trader once, returning whether it completed without error"""
+        succeeded = True
         try:
             await self.run_with_trace()
         except Exception as e:
             print(f"Error running trader {self.name}: {e}")
+            succeeded = False
         self.do_trade = not self.do_trade
+        return succeeded
@@ -1,11 +1,18 @@
-from traders import Trader
-from typing import List
 import asyncio
 from tracers import LogTracer
 from agents import add_trace_processor
 from market import is_market_open
+from retention import start_log_retention
+from mcp_pool import MCPServerPool
+from accounts_client import accounts_session
+from accounts import Account
+from database import read_traders, write_trader, write_shard_metrics
+from shards import HOST, Shard, WorkerPool, assign
+from datetime import datetime
 from dotenv import load_dotenv
 import os
+import json
+import time
 
 load_dotenv(override=True)
 
@@ -14,6 +21,11 @@ RUN_EVEN_WHEN_MARKET_IS_CLOSED = (
     os.getenv("RUN_EVEN_WHEN_MARKET_IS_CLOSED", "false").strip().lower() == "true"
 )
 USE_MANY_MODELS = os.getenv("USE_MANY_MODELS", "false").strip().lower() == "true"
+FLOOR_WORKERS = int(os.getenv("FLOOR_WORKERS", "1"))
+TRADERS_FILE = os.getenv("TRADERS_FILE")
+# The four original traders are written to the traders table once, when it's empty, with the models
+# USE_MANY_MODELS picks at that point. Set RESEED_TRADERS to write them again, models included
+RESEED_TRADERS = os.getenv("RESEED_TRADERS", "false").strip().lower() == "true"
 
 names = ["Warren", "George", "Ray", "Cathie"]
 lastnames = ["Patience", "Bold", "Systematic", "Crypto"]
@@ -31,24 +43,96 @@ else:
     short_model_names = ["GPT 4o mini"] * 4
 
 
-def create_traders() -> List[Trader]:
-    traders = []
-    for name, lastname, model_name in zip(names, lastnames, model_names):
-        traders.append(Trader(name, lastname, model_name))
-    return traders
+def seed_traders(force: bool = False) -> None:
+    """
+    Write the four original traders, with the models chosen by USE_MANY_MODELS, if the traders
+    table is empty or force is set. Otherwise the table is left alone, so edits to it stick.
+    """
+    if force or not read_traders(enabled_only=False):
+        for name, lastname, model_name, short_model_name in zip(names, lastnames, model_names, short_model_names):
+            write_trader(name, lastname, model_name, short_model_name)
+
+
+def load_trader_definitions() -> list[dict]:
+    """
+    The enabled traders from the traders table, seeded with the four originals the first time,
+    or every time if RESEED_TRADERS is set. If TRADERS_FILE is set, its entries are added or
+    updated first: a JSON list of objects with name, lastname, model_name and optionally
+    short_model_name, enabled and a starting strategy.
+    """
+    if TRADERS_FILE:
+        with open(TRADERS_FILE) as f:
+            for entry in json.load(f):
+                write_trader(
+                    entry["name"],
+                    entry["lastname"],
+                    entry["model_name"],
+                    entry.get("short_model_name"),
+                    entry.get("enabled", True),
+                )
+                account = Account.get(entry["name"])
+                if entry.get("strategy") and not account.strategy:
+                    account.reset(entry["strategy"])
+    seed_traders(force=RESEED_TRADERS)
+    return read_traders()
+
+
+def seconds_until_next_run(every_n_minutes: int = RUN_EVERY_N_MINUTES) -> float:
+    """
+    Runs start on wall-clock boundaries (on the hour for 60 minutes, at :00, :15, :30 and :45 for 15),
+    so a slow run doesn't push every later run back, and restarts don't shift the schedule.
+    """
+    period = every_n_minutes * 60
+    return period - time.time() % period
+
+
+def report(started: str, metrics: list[dict], seconds: float) -> None:
+    write_shard_metrics(started, HOST, metrics)
+    for m in metrics:
+        rate = m["traders"] / m["seconds"] * 60 if m["seconds"] else 0.0
+        print(
+            f"Shard {m['shard']}: {m['traders']} traders in {m['seconds']:.1f}s "
+            f"({rate:.1f}/min), {m['failures']} failed"
+        )
+    print(f"Cycle took {seconds:.1f}s for {sum(m['traders'] for m in metrics)} traders across {len(metrics)} shards")
 
 
 async def run_every_n_minutes():
     add_trace_processor(LogTracer())
-    traders = create_traders()
-    while True:
-        if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
-            await asyncio.gather(*[trader.run() for trader in traders])
-        else:
-            print("Market is closed, skipping run")
-        await asyncio.sleep(RUN_EVERY_N_MINUTES * 60)
+    start_log_retention()
+    if FLOOR_WORKERS > 1:
+        await coordinate(WorkerPool(FLOOR_WORKERS))
+        return
+    # One of each MCP server is started once and shared by every trader for every run;
+    # the session used to read account reports and strategies stays open alongside them
+    async with MCPServerPool() as pool, accounts_session():
+        await pool.start()
+        shard = Shard(0, pool)
+        while True:
+            if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
+                started, start = datetime.now().strftime("%Y-%m-%d %H:%M:%S"), time.perf_counter()
+                metrics = await shard.run(assign(load_trader_definitions(), 1)[0])
+                report(started, [metrics], time.perf_counter() - start)
+            else:
+                print("Market is closed, skipping run")
+            await asyncio.sleep(seconds_until_next_run())
+
+
+async def coordinate(workers: WorkerPool):
+    """Hand each worker process its shard of the traders every cycle, and record how each shard did"""
+    try:
+        while True:
+            if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
+                started, start = datetime.now().strftime("%Y-%m-%d %H:%M:%S"), time.perf_counter()
+                metrics = await workers.run_cycle(load_trader_definitions(), timeout=RUN_EVERY_N_MINUTES * 60)
+                report(started, metrics, time.perf_counter() - start)
+            else:
+                print("Market is closed, skipping run")
+            await asyncio.sleep(seconds_until_next_run())
+    finally:
+        workers.close()
 
 
 if __name__ == "__main__":
-    print(f"Starting scheduler to run every {RUN_EVERY_N_MINUTES} minutes")
+    print(f"Starting scheduler to run every {RUN_EVERY_N_MINUTES} minutes with {FLOOR_WORKERS} worker(s)")
     asyncio.run(run_every_n_minutes())